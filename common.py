@@ -1,8 +1,62 @@
-from typing import Any, Tuple
+import array
+import functools
+import hashlib
+import itertools
+import operator
+import mmap as mmap_module
+from typing import Any, NamedTuple, Tuple
+
+# Translates the '0'/'1' digits of a binary string into 0/1 bytes
+BITS_TO_BYTES = bytes.maketrans(b'01', b'\x00\x01')
 
 def taxicab_distance(from_: Tuple[int, int], to: Tuple[int, int]):
     return abs(from_[0] - to[0]) + abs(from_[1] - to[1])
 
+def find_cycle(state, step, fingerprint):
+    """ Apply step (which returns the next state) until fingerprint(state) repeats. Only the fingerprints are kept.
+        Returns (state, start, length), where the returned state is the one after start + length steps. """
+    seen = {}
+    steps = 0
+    while (key := fingerprint(state)) not in seen:
+        seen[key] = steps
+        state = step(state)
+        steps += 1
+    return (state, seen[key], steps - seen[key])
+
+def state_after(state, step, n, fingerprint):
+    """ Return the state after n steps. Once a cycle is found, the remaining whole cycles are skipped. """
+    seen = {}
+    for i in range(n):
+        key = fingerprint(state)
+        if key in seen:
+            for _ in range((n - i) % (i - seen[key])):
+                state = step(state)
+            return state
+        seen[key] = i
+        state = step(state)
+    return state
+
+def zobrist_key(index, value):
+    """ Pseudo-random 64-bit key for a value stored at a given index: a 64-bit BLAKE2 hash of an exact encoding
+        of both. The built-in hash() isn't used, since it maps many values to the same hash (hash(-1) == hash(-2),
+        and ints are reduced modulo 2**61 - 1). Ints and strings are encoded exactly; anything else by its repr. """
+    if isinstance(value, int):
+        data = b'i' + value.to_bytes(value.bit_length() // 8 + 1, 'little', signed=True)
+    elif isinstance(value, str):
+        data = b's' + value.encode()
+    else:
+        data = b'r' + repr(value).encode()
+    digest = hashlib.blake2b(index.to_bytes(8, 'little', signed=True) + data, digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+class Orientation(NamedTuple):
+    """ One of the 8 ways to orient a grid: mirror x and/or y, then (optionally) swap the axes """
+    transposed: bool = False
+    flip_x: bool = False
+    flip_y: bool = False
+
+IDENTITY = Orientation()
+
 class GenericGrid:
     def __init__(self, data: list[list[Any]], wrapping = False, default_value: Any = None):
         self.data = list(data)
@@ -14,12 +68,21 @@ class GenericGrid:
         self.wrapping = wrapping
         self.default_value = default_value
 
+        # transpose/flip/rotate don't move any cells; they change the orientation, which is applied on every access.
+        # row_count and col_count are always given in the current orientation, while self.data is left as-is.
+        self.orientation = IDENTITY
+
+        # Zobrist hash of the stored cells, kept up to date by set_cell once track_fingerprint() has been called
+        self.fingerprint = None
+
     def __eq__(self, other):
         if not isinstance(other, GenericGrid):
             return False
         if not (other.row_count == self.row_count and other.col_count == self.col_count):
             return False
-        return self.data == other.data
+        if isinstance(other, ArrayGrid):
+            return other == self
+        return [list(row) for row in self.rows()] == [list(row) for row in other.rows()]
 
     @classmethod
     def wrap_coordinate(cls, c, max_count):
@@ -35,63 +98,105 @@ class GenericGrid:
             for x in range(self.col_count):
                 yield (x, y)
 
+    def physical_coordinates(self, position: Tuple[int, int]) -> Tuple[int, int]:
+        """ Map an in-bounds position in the current orientation to (x, y) indices into self.data """
+        (x, y) = position
+        (transposed, flip_x, flip_y) = self.orientation
+        if flip_x: x = self.col_count - 1 - x
+        if flip_y: y = self.row_count - 1 - y
+        return (y, x) if transposed else (x, y)
+
     def row(self, y) -> list[Any]:
-        if y >= 0 and y < self.row_count:
-            return self.data[y]
-        elif self.wrapping:
-            y = GenericGrid.wrap_coordinate(y, self.row_count)
-            return self.data[y]
-        else:
-            return [None] * self.col_count
+        if not (y >= 0 and y < self.row_count):
+            if not self.wrapping:
+                return [None] * self.col_count
+            y %= self.row_count
+
+        (transposed, flip_x, flip_y) = self.orientation
+        if flip_y: y = self.row_count - 1 - y
+        line = [r[y] for r in self.data] if transposed else self.data[y]
+        return list(reversed(line)) if flip_x else line
 
     def col(self, x) -> list[Any]:
-        if x >= 0 and x < self.col_count:
-            return [self.data[y][x] for y in range(self.row_count)]
-        elif self.wrapping:
-            x = GenericGrid.wrap_coordinate(x, self.col_count)
-            return [self.data[y][x] for y in range(self.row_count)]
-        else:
-            return [None] * self.row_count
+        if not (x >= 0 and x < self.col_count):
+            if not self.wrapping:
+                return [None] * self.row_count
+            x %= self.col_count
+
+        (transposed, flip_x, flip_y) = self.orientation
+        if flip_x: x = self.col_count - 1 - x
+        # In a transposed grid, columns are stored as rows, so they can be returned without copying
+        line = self.data[x] if transposed else [r[x] for r in self.data]
+        return list(reversed(line)) if flip_y else line
 
     def rows(self) -> list[list[Any]]:
-        return self.data
+        if self.orientation == IDENTITY:
+            return self.data
+        return [self.row(y) for y in range(self.row_count)]
 
     def cols(self) -> list[list[Any]]:
-        return [list(x) for x in zip(*self.data)]
+        return [list(x) for x in zip(*self.rows())]
 
     def transpose(self):
-        self.data = self.cols()
-        self.row_count = len(self.data)
-        self.col_count = len(self.data[0]) if len(self.data) > 0 else 0
+        (transposed, flip_x, flip_y) = self.orientation
+        self.orientation = Orientation(not transposed, flip_y, flip_x)
+        self.row_count, self.col_count = self.col_count, self.row_count
 
     def flip_horizontal(self):
-        for y in range(self.row_count):
-            self.data[y] = list(reversed(self.data[y]))
+        self.orientation = self.orientation._replace(flip_x = not self.orientation.flip_x)
 
     def flip_vertical(self):
-        for x in range(self.col_count):
-            rev = reversed(self.col(x))
-            for y, c in enumerate(rev):
-                self.data[y][x] = c
+        self.orientation = self.orientation._replace(flip_y = not self.orientation.flip_y)
 
     def rotate(self):
         """ Rotate the grid 90 degrees, clockwise. """
         self.transpose()
         self.flip_horizontal()
 
+    def materialize(self):
+        """ Rewrite self.data in the current orientation, so that accesses no longer need to be transformed """
+        if self.orientation != IDENTITY:
+            self.data = [list(row) for row in self.rows()]
+            self.orientation = IDENTITY
+            if self.fingerprint is not None:
+                self.track_fingerprint()
+
+    def track_fingerprint(self):
+        """ Start maintaining self.fingerprint, a hash of all cells that is updated incrementally on every set_cell.
+            It covers the cells as stored, so it doesn't change with the orientation. """
+        self.fingerprint = 0
+        for y, row in enumerate(self.data):
+            for x, cell in enumerate(row):
+                self.fingerprint ^= zobrist_key(y * len(row) + x, cell)
+
     def cell_at(self, position: Tuple[int, int]):
         (x, y) = position
         if x >= 0 and y >= 0 and x < self.col_count and y < self.row_count:
-            return self.data[y][x]
+            pass
         elif self.wrapping:
             # Allow infinite wrapping in all directions
-            x = GenericGrid.wrap_coordinate(x, self.col_count)
-            y = GenericGrid.wrap_coordinate(y, self.row_count)
-            return self.data[y][x]
+            x %= self.col_count
+            y %= self.row_count
         else:
             # Not wrapping and out of bounds
             return None
 
+        if self.orientation != IDENTITY:
+            (x, y) = self.physical_coordinates((x, y))
+        return self.data[y][x]
+
+    def set_cell(self, position: Tuple[int, int], value: Any):
+        (x, y) = position
+        if self.wrapping:
+            x %= self.col_count
+            y %= self.row_count
+        assert(0 <= x < self.col_count and 0 <= y < self.row_count)
+        (x, y) = self.physical_coordinates((x, y))
+        if self.fingerprint is not None:
+            index = y * len(self.data[y]) + x
+            self.fingerprint ^= zobrist_key(index, self.data[y][x]) ^ zobrist_key(index, value)
+        self.data[y][x] = value
+
     def neighbor_coordinates(self, position: Tuple[int, int], include_diagonals=True) -> list[Tuple[int, int]]:
         coordinate_pairs = []
         (x, y) = position
@@ -110,20 +215,72 @@ class GenericGrid:
         """ Return a list of all neighboring cells, wrapping or inserting default valued cells if needed. """
         return [self.cell_at(coordinate_pair) for coordinate_pair in self.neighbor_coordinates(position, include_diagonals)]
 
+    def match_mask(self, predicate) -> list[int]:
+        """ Apply predicate to every cell once. Bit x of mask[y] is set if predicate(self.cell_at((x, y))) is true. """
+        return [int(''.join('1' if predicate(cell) else '0' for cell in reversed(row)) or '0', 2) for row in self.rows()]
+
+    def neighbor_masks(self, predicate, include_diagonals=True) -> list[list[int]]:
+        """ Whole-grid version of neighbors(): one list of row masks per neighbor offset, in neighbor_coordinates order.
+            Bit x of masks[i][y] is set if the i:th neighbor of (x, y) matches the predicate. Cells outside the grid
+            wrap if wrapping = True, and are default_value cells otherwise. """
+        mask = self.match_mask(predicate)
+        width, height = self.col_count, self.row_count
+        full = (1 << width) - 1
+        pad = 0 if self.wrapping or not predicate(self.default_value) else 1
+
+        def row_mask(y):
+            if 0 <= y < height:
+                return mask[y]
+            elif self.wrapping:
+                return mask[y % height]
+            return full if pad else 0
+
+        def shift(m, dx):
+            """ Move bit x + dx to bit x """
+            if dx == 1:
+                return (m >> 1) | (((m & 1) if self.wrapping else pad) << (width - 1))
+            elif dx == -1:
+                return ((m << 1) & full) | ((m >> (width - 1)) if self.wrapping else pad)
+            return m
+
+        if width == 0 or height == 0:
+            return [[0] * height for _ in self.neighbor_coordinates((0, 0), include_diagonals)]
+        return [[shift(row_mask(y + dy), dx) for y in range(height)] for (dx, dy) in self.neighbor_coordinates((0, 0), include_diagonals)]
+
+    def adjacent_mask(self, predicate, include_diagonals=True) -> list[int]:
+        """ Bit x of mask[y] is set if any neighbor of (x, y) matches the predicate """
+        return [functools.reduce(operator.or_, masks) for masks in zip(*self.neighbor_masks(predicate, include_diagonals))]
+
+    def neighbor_counts(self, predicate, include_diagonals=True):
+        """ Return an ArrayGrid where each cell holds the number of neighbors that match the predicate """
+        width = self.col_count
+        counts = bytearray()
+        for masks in zip(*self.neighbor_masks(predicate, include_diagonals)):
+            # Spread each mask into one byte per cell and add them up as big integers; counts are <= 8, so bytes never carry
+            total = sum(int.from_bytes(format(m, f'0{width}b')[::-1].encode().translate(BITS_TO_BYTES), 'little') for m in masks)
+            counts += total.to_bytes(width, 'little')
+        return ArrayGrid.from_buffer(counts, self.row_count, width, wrapping=self.wrapping, default_value=0)
+
     def insert_row(self, before_row, new_cells):
         assert(self.row_count >= before_row)
         assert(len(new_cells) == self.col_count)
+        self.materialize()
         self.data.insert(before_row, new_cells)
         self.row_count += 1
+        if self.fingerprint is not None:
+            self.track_fingerprint()
 
     def insert_col(self, before_col, new_cells):
         assert(self.col_count >= before_col)
         assert(len(new_cells) == self.row_count)
+        self.materialize()
 
         for y in range(self.row_count):
             self.data[y].insert(before_col, new_cells[y])
 
         self.col_count += 1
+        if self.fingerprint is not None:
+            self.track_fingerprint()
 
 class CharacterGrid(GenericGrid):
     """ Each cell is one character, usually ASCII, created from a list of strings """
@@ -131,8 +288,248 @@ class CharacterGrid(GenericGrid):
         data = [list(line) for line in lines]
         super().__init__(data, wrapping, default_value)
 
+    @classmethod
+    def from_file(cls, path, mmap = False, wrapping = False, default_value = None):
+        """ Load a grid from a file. With mmap=True, the file is memory-mapped and served by an ArrayCharacterGrid,
+            whose row() and col() return memoryviews of byte values rather than lists of characters, so e.g.
+            '#' in grid.row(y) is always False; use bytes(grid.row(y)) and b'#' instead.
+            Subclasses can't be memory-mapped; derive them from ArrayCharacterGrid and use its from_file instead. """
+        if mmap:
+            cls.check_mappable()
+            return ArrayCharacterGrid.from_file(path, wrapping, default_value)
+        return cls(open(path).read().splitlines(), wrapping, default_value)
+
+    @classmethod
+    def grids_from_file(cls, path, mmap = False, wrapping = False, default_value = None):
+        """ Load a file containing several grids separated by blank lines. mmap=True works as for from_file. """
+        if mmap:
+            cls.check_mappable()
+            return ArrayCharacterGrid.grids_from_file(path, wrapping, default_value)
+        lines = open(path).read().splitlines()
+        return [cls(list(g), wrapping, default_value) for k, g in itertools.groupby(lines, bool) if k]
+
+    @classmethod
+    def check_mappable(cls):
+        # A memory-mapped grid is always an ArrayCharacterGrid, which would silently drop a subclass's methods
+        if cls is not CharacterGrid:
+            raise TypeError(f"{cls.__name__} can't be memory-mapped; load it with mmap=False or derive it from ArrayCharacterGrid")
+
+    def print(self):
+        print(self.dump())
+
+    def dump(self):
+        return '\n'.join([''.join(row) for row in self.rows()])
+
+def map_file(path):
+    """ Memory-map a file copy-on-write: writes (e.g. through set_cell) stay private and never reach the file """
+    with open(path, 'rb') as f:
+        try:
+            return mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_COPY)
+        except ValueError:
+            # Empty files can't be mapped
+            return bytearray()
+
+class ArrayGrid(GenericGrid):
+    """ A grid stored in a single flat buffer (an array.array by default) instead of a list of lists.
+
+        Cell (x, y) lives at buffer[offset + y * row_stride + x * col_stride]. Rows and columns are returned as
+        memoryview slices into the buffer, and transpose/flip/rotate only change the offset and strides,
+        so they take O(1) time and never copy any cells. Write through set_cell (or into a row/col view). """
+    def __init__(self, data: list[list[Any]], typecode = 'q', wrapping = False, default_value: Any = None):
+        row_count = len(data)
+        col_count = len(data[0]) if row_count > 0 else 0
+        buffer = array.array(typecode, itertools.chain.from_iterable(data))
+        self.attach(buffer, row_count, col_count)
+        self.wrapping = wrapping
+        self.default_value = default_value
+
+    @classmethod
+    def from_buffer(cls, buffer, row_count, col_count, row_stride = None, offset = 0, wrapping = False, default_value: Any = None):
+        """ Create a grid on top of an existing buffer (bytearray, array.array, mmap, ...) without copying it """
+        grid = cls.__new__(cls)
+        grid.attach(buffer, row_count, col_count, row_stride, offset)
+        grid.wrapping = wrapping
+        grid.default_value = default_value
+        return grid
+
+    def attach(self, buffer, row_count, col_count, row_stride = None, offset = 0):
+        self.buffer = buffer
+        self.view = memoryview(buffer)
+        self.row_count = row_count
+        self.col_count = col_count
+        self.row_stride = col_count if row_stride is None else row_stride
+        self.col_stride = 1
+        self.offset = offset
+        if getattr(self, 'fingerprint', None) is not None:
+            self.track_fingerprint()
+        else:
+            self.fingerprint = None
+
+    def track_fingerprint(self):
+        """ Like GenericGrid.track_fingerprint, keyed on buffer indices. Writes through row/col views are not tracked. """
+        self.fingerprint = 0
+        for y in range(self.row_count):
+            for x in range(self.col_count):
+                index = self.index((x, y))
+                self.fingerprint ^= zobrist_key(index, self.view[index])
+
+    def __eq__(self, other):
+        if not isinstance(other, GenericGrid):
+            return False
+        if not (other.row_count == self.row_count and other.col_count == self.col_count):
+            return False
+        return all(self.cell_at(position) == other.cell_at(position) for position in self.coordinate_pairs())
+
+    # Conversion between the values stored in the buffer and the values returned by cell_at
+    def to_cell(self, value):
+        return value
+
+    def from_cell(self, value):
+        return value
+
+    def index(self, position: Tuple[int, int]):
+        """ Buffer index for a position, or None if the position is outside of a non-wrapping grid """
+        (x, y) = position
+        if not (0 <= x < self.col_count and 0 <= y < self.row_count):
+            if not self.wrapping:
+                return None
+            x %= self.col_count
+            y %= self.row_count
+        return self.offset + y * self.row_stride + x * self.col_stride
+
+    def _line(self, start, step, count):
+        stop = start + step * count
+        return self.view[start:stop if stop >= 0 else None:step]
+
+    def row(self, y):
+        if not 0 <= y < self.row_count:
+            if not self.wrapping:
+                return [None] * self.col_count
+            y %= self.row_count
+        return self._line(self.offset + y * self.row_stride, self.col_stride, self.col_count)
+
+    def col(self, x):
+        if not 0 <= x < self.col_count:
+            if not self.wrapping:
+                return [None] * self.row_count
+            x %= self.col_count
+        return self._line(self.offset + x * self.col_stride, self.row_stride, self.row_count)
+
+    def rows(self):
+        return [self.row(y) for y in range(self.row_count)]
+
+    def cols(self):
+        return [self.col(x) for x in range(self.col_count)]
+
+    def transpose(self):
+        self.row_count, self.col_count = self.col_count, self.row_count
+        self.row_stride, self.col_stride = self.col_stride, self.row_stride
+
+    def flip_horizontal(self):
+        self.offset += (self.col_count - 1) * self.col_stride
+        self.col_stride = -self.col_stride
+
+    def flip_vertical(self):
+        self.offset += (self.row_count - 1) * self.row_stride
+        self.row_stride = -self.row_stride
+
+    def cell_at(self, position: Tuple[int, int]):
+        i = self.index(position)
+        return None if i is None else self.to_cell(self.view[i])
+
+    def set_cell(self, position: Tuple[int, int], value: Any):
+        i = self.index(position)
+        assert(i is not None)
+        value = self.from_cell(value)
+        if self.fingerprint is not None:
+            self.fingerprint ^= zobrist_key(i, self.view[i]) ^ zobrist_key(i, value)
+        self.view[i] = value
+
+    def new_buffer(self, rows):
+        return array.array(self.view.format, itertools.chain.from_iterable(rows))
+
+    def materialize(self):
+        """ Copy the cells into a fresh, contiguous buffer in the current orientation """
+        self.attach(self.new_buffer(self.rows()), self.row_count, self.col_count)
+
+    def insert_row(self, before_row, new_cells):
+        assert(self.row_count >= before_row)
+        assert(len(new_cells) == self.col_count)
+        rows = self.rows()
+        rows.insert(before_row, [self.from_cell(c) for c in new_cells])
+        self.attach(self.new_buffer(rows), self.row_count + 1, self.col_count)
+
+    def insert_col(self, before_col, new_cells):
+        assert(self.col_count >= before_col)
+        assert(len(new_cells) == self.row_count)
+        rows = [list(row) for row in self.rows()]
+        for y in range(self.row_count):
+            rows[y].insert(before_col, self.from_cell(new_cells[y]))
+        self.attach(self.new_buffer(rows), self.row_count, self.col_count + 1)
+
+class ArrayCharacterGrid(ArrayGrid):
+    """ Like CharacterGrid, but stored as one byte per cell. cell_at returns one-character strings, while
+        row() and col() return memoryviews of the raw bytes (use bytes(grid.row(y)) to get a copy). """
+    def __init__(self, lines: list[str], wrapping = False, default_value = None):
+        row_count = len(lines)
+        col_count = len(lines[0]) if row_count > 0 else 0
+        self.attach(bytearray(''.join(lines).encode('latin-1')), row_count, col_count)
+        self.wrapping = wrapping
+        self.default_value = default_value
+
+    @classmethod
+    def from_file(cls, path, wrapping = False, default_value = None):
+        """ Memory-map a file and serve the grid directly from the mapping, without reading it into memory """
+        buffer = map_file(path)
+        return cls.from_region(buffer, 0, len(buffer), wrapping, default_value)
+
+    @classmethod
+    def grids_from_file(cls, path, wrapping = False, default_value = None):
+        """ Memory-map a file containing several grids separated by blank lines; all grids share the same mapping """
+        buffer = map_file(path)
+        grids = []
+        start = 0
+        while start < len(buffer):
+            if buffer[start] == ord('\n'):
+                start += 1
+                continue
+            end = buffer.find(b'\n\n', start)
+            end = len(buffer) if end == -1 else end
+            grids.append(cls.from_region(buffer, start, end, wrapping, default_value))
+            start = end
+        return grids
+
+    @classmethod
+    def from_region(cls, buffer, start, end, wrapping = False, default_value = None):
+        """ Create a grid from the newline-separated rows in buffer[start:end]. Every row must be equally long. """
+        while end > start and buffer[end - 1] == ord('\n'):
+            end -= 1
+
+        # The row stride is found once, from the first newline; all other rows are located from it
+        newline = buffer.find(b'\n', start, end)
+        col_count = (end if newline == -1 else newline) - start
+        row_stride = col_count + 1
+        row_count = (end - start + 1) // row_stride if end > start else 0
+        assert(row_count * row_stride == end - start + 1 or row_count == 0)
+
+        return cls.from_buffer(buffer, row_count, col_count, row_stride, start, wrapping, default_value)
+
+    def match_mask(self, predicate) -> list[int]:
+        # Evaluate the predicate once per byte value instead of once per cell, and let bytes.translate do the rest
+        table = bytes(ord('1') if predicate(chr(b)) else ord('0') for b in range(256))
+        return [int(bytes(row).translate(table)[::-1] or b'0', 2) for row in self.rows()]
+
+    def to_cell(self, value):
+        return chr(value)
+
+    def from_cell(self, value):
+        return ord(value)
+
+    def new_buffer(self, rows):
+        return bytearray(b''.join(bytes(row) for row in rows))
+
     def print(self):
         print(self.dump())
 
     def dump(self):
-        return '\n'.join([''.join(row) for row in self.data])
\ No newline at end of file
+        return b'\n'.join([bytes(row) for row in self.rows()]).decode('latin-1')
@@ -1,29 +1,65 @@
-lines = open('data/day1.txt', 'r').readlines()
-
 digitMap = {"one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9}
 
-sum = 0
-for line in lines:
-    digits = [c for c in line if c.isdigit()]
-    sum += int(digits[0] + digits[-1])
+class DigitMatcher:
+    """ An Aho-Corasick automaton for a set of words (each standing for a digit), compiled into a DFA over bytes.
+
+        Every byte is one table lookup, with no substrings created, and matches that overlap (like "eightwo") are all
+        found. None of the words here contain another one, so matches come in the order of their first character. """
+    def __init__(self, words):
+        # Build the trie
+        goto = [{}]
+        output = [0] # Matched digit + 1 for each state, 0 if no word ends there
+        for word, value in words.items():
+            state = 0
+            for byte in word.encode():
+                if byte not in goto[state]:
+                    goto[state][byte] = len(goto)
+                    goto.append({})
+                    output.append(0)
+                state = goto[state][byte]
+            output[state] = value + 1
 
-print(f"Part 1: {sum}")
+        # Fill in the full transition table breadth-first, following failure links for missing edges
+        self.table = [0] * (len(goto) * 256)
+        fail = [0] * len(goto)
+        queue = [0]
+        for state in queue:
+            for byte in range(256):
+                if (child := goto[state].get(byte)) is not None:
+                    fail[child] = self.table[fail[state] << 8 | byte] if state != 0 else 0
+                    output[child] = output[child] or output[fail[child]]
+                    self.table[state << 8 | byte] = child
+                    queue.append(child)
+                else:
+                    self.table[state << 8 | byte] = self.table[fail[state] << 8 | byte] if state != 0 else 0
+        self.output = output
 
-sum = 0
-for line in lines:
-    digits = []
-    pos = 0
+    def calibration_sum(self, f, chunk_size = 1 << 16):
+        """ Stream a binary file in chunks, and add up the first and last digit of each line.
+            Lines are scanned once, front to back, remembering the first and the latest match. """
+        table, output = self.table, self.output
+        total = 0
+        state = first = last = 0
+        while chunk := f.read(chunk_size):
+            for byte in chunk:
+                if byte == ord('\n'):
+                    if first:
+                        total += (first - 1) * 10 + (last - 1)
+                    state = first = last = 0
+                    continue
+                state = table[state << 8 | byte]
+                if match := output[state]:
+                    first = first or match
+                    last = match
+        if first:
+            total += (first - 1) * 10 + (last - 1)
+        return total
 
-    while (partialLine := line[pos:]):
-        if partialLine[0].isdigit():
-            digits.append(partialLine[0])
-        else:
-            for k,v in digitMap.items():
-                if partialLine.startswith(k):
-                    digits += str(v)
-                    break
-        pos += 1
+if __name__=='__main__':
+    digits = {str(d): d for d in range(10)}
 
-    sum += int(digits[0] + digits[-1])
+    with open('data/day1.txt', 'rb') as f:
+        print(f"Part 1: {DigitMatcher(digits).calibration_sum(f)}")
 
-print(f"Part 2: {sum}")
\ No newline at end of file
+    with open('data/day1.txt', 'rb') as f:
+        print(f"Part 2: {DigitMatcher(digits | digitMap).calibration_sum(f)}")
@@ -1,7 +1,6 @@
-import itertools
 from enum import IntFlag
 
-from common import GenericGrid
+from common import ArrayCharacterGrid
 
 class Dir(IntFlag):
     EMPTY = 0
@@ -30,129 +29,112 @@ class Dir(IntFlag):
     def to_char(self):
         return {self.VERT: '|', self.HOR: '-', self.NE: 'L', self.NW: 'J', self.SW: '7', self.SE: 'F', self.EMPTY: '.'}[self]
 
-class Pipe:
-    def __init__(self, ch):
-        self.ch = ch
-        self.dirs = Dir.from_char(ch)
-        self.part_of_main_loop = False
-
-    def connects(self, other_dir):
-        """ Does this pipe allow movement in the direction other_dir? """
-        return bool(self.dirs & other_dir)
-
-    def __repr__(self):
-        return self.ch
-
-def next_dir(pipe_dirs, last_dir):
-    """ When we reach a new pipe, the direction to go is the one of its allowed directions that we did NOT come from """
-    return [d for d in list(pipe_dirs) if d != last_dir.opposite()][0]
-
-def next_pos(position, dir):
-    """ Given a position and a direction to follow, where would we end up? """
-    offset_x = 0
-    offset_y = 0
-    assert(dir in [Dir.N, Dir.S, Dir.W, Dir.E])
-    if dir == Dir.N: offset_y = -1
-    elif dir == Dir.S: offset_y = 1
-    elif dir == Dir.W: offset_x = -1
-    elif dir == Dir.E: offset_x = 1
-
-    (x, y) = position
-    return (x + offset_x, y + offset_y)
-
-class PipeGrid(GenericGrid):
+# Directions as indices into these tables, clockwise from north
+DIRS = (Dir.N, Dir.E, Dir.S, Dir.W)
+STEP_X = (0, 1, 0, -1)
+STEP_Y = (-1, 0, 1, 0)
+
+def build_turn_table():
+    """ TURNS[ch][d]: the direction to continue in after moving in direction d onto the pipe with byte value ch """
+    table = [(None,) * 4 for _ in range(256)]
+    for ch in '|-LJ7F':
+        pipe_dirs = Dir.from_char(ch)
+        turns = []
+        for d in range(4):
+            # We enter through the side opposite to the direction we're moving in, and leave through the other one
+            came_from = DIRS[(d + 2) % 4]
+            turns.append(DIRS.index(pipe_dirs & ~came_from) if pipe_dirs & came_from else None)
+        table[ord(ch)] = tuple(turns)
+    return table
+
+TURNS = build_turn_table()
+
+class PipeGrid(ArrayCharacterGrid):
     def __init__(self, lines, wrapping=False, default_value=None):
-        self._start_coordinates = None
+        super().__init__(lines, wrapping, default_value)
+        self.replace_start()
 
-        # Parse the data and create the grid
-        data = []
-        for y, line in enumerate(lines):
-            row = []
-            for x, ch in enumerate(line):
-                row.append(Pipe(ch))
-                if ch == 'S':
-                    self._start_coordinates = (x, y)
-            data.append(row)
-
-        super().__init__(data, wrapping, default_value)
+    @classmethod
+    def from_buffer(cls, *args, **kwargs):
+        # Grids loaded by from_file are created through here rather than __init__
+        grid = super().from_buffer(*args, **kwargs)
+        grid.replace_start()
+        return grid
+
+    def replace_start(self):
+        """ Find the S, and overwrite it with the pipe that fits its neighbors """
+        start = self.buffer.find(b'S', self.offset)
+        if start == -1:
+            self._start_coordinates = None
+        else:
+            (y, x) = divmod(start - self.offset, self.row_stride)
+            self._start_coordinates = (x, y)
+        self._loop = None
 
         # Figure out the actual type of pipe at the starting location (S) based on the neighboring pipes
         my_directions = Dir.EMPTY
         (N, W, E, S) = self.neighbors(self.start_coordinates(), include_diagonals=False)
-        if N and N.connects(Dir.S): my_directions |= Dir.N
-        if S and S.connects(Dir.N): my_directions |= Dir.S
-        if E and E.connects(Dir.W): my_directions |= Dir.E
-        if W and W.connects(Dir.E): my_directions |= Dir.W
+        if N and Dir.from_char(N) & Dir.S: my_directions |= Dir.N
+        if S and Dir.from_char(S) & Dir.N: my_directions |= Dir.S
+        if E and Dir.from_char(E) & Dir.W: my_directions |= Dir.E
+        if W and Dir.from_char(W) & Dir.E: my_directions |= Dir.W
 
         # Finally, overwrite the S with a pipe of the correct type
-        x, y = self.start_coordinates()
-        self.data[y][x] = Pipe(my_directions.to_char())
+        self.set_cell(self.start_coordinates(), my_directions.to_char())
 
     def dirs_at(self, position):
         """ Which directions are allowed for the pipe at the given position? """
-        return self.cell_at(position).dirs # type: ignore
+        return Dir.from_char(self.cell_at(position))
 
     def start_coordinates(self):
         assert(self._start_coordinates is not None)
         return self._start_coordinates
 
+    def trace_loop(self):
+        """ Follow the main loop once, using the turn table. Returns (loop length, twice the signed loop area). """
+        if self._loop is None:
+            view, offset, row_stride, col_stride = self.view, self.offset, self.row_stride, self.col_stride
+            start = self.start_coordinates()
+            (x, y) = start
+
+            # Pick a direction at random; it doesn't matter
+            d = next(d for d in range(4) if self.dirs_at(start) & DIRS[d])
+            steps = 0
+            area = 0
+
+            while True: # Poor man's do-while loop (I really wish Python implemented them)
+                next_x, next_y = x + STEP_X[d], y + STEP_Y[d]
+                # Shoelace formula, one edge at a time
+                area += x * next_y - next_x * y
+                x, y = next_x, next_y
+                steps += 1
+                if (x, y) == start:
+                    break
+                d = TURNS[view[offset + y * row_stride + x * col_stride]][d]
+
+            self._loop = (steps, area)
+        return self._loop
+
     def most_steps(self):
         """ Count the steps along the entire pipe network, and calculate the furthest distance from that """
-
-        # Pick a direction at random; it doesn't matter
-        pos = self.start_coordinates()
-        outgoing_dir = list(self.dirs_at(pos))[0]
-        steps = 0
-
-        while True: # Poor man's do-while loop (I really wish Python implemented them)
-            self.cell_at(pos).part_of_main_loop = True # type: ignore
-            pos = next_pos(pos, outgoing_dir)
-            last_dir = outgoing_dir
-            outgoing_dir = next_dir(self.dirs_at(pos), last_dir)
-            steps += 1
-            if pos == self.start_coordinates():
-                return steps // 2
-
-    def is_inside_boundary(self, position):
-        """" True if a position is within the outer boundary of the loop -- NOT necessarily enclosed """
-
-        def is_pipe(cell):
-            return cell.part_of_main_loop
-
-        # If we hit part of the loop in all four directions, we're inside the loop boundary.
-        # This area might not count as *enclosed*, though.
-        x, y = position
-        return not is_pipe(self.cell_at(position)) and \
-               any(is_pipe(cell) for cell in self.row(y)[0:x]) and \
-               any(is_pipe(cell) for cell in self.row(y)[x+1:]) and \
-               any(is_pipe(cell) for cell in self.col(x)[0:y]) and \
-               any(is_pipe(cell) for cell in self.col(x)[y+1:])
+        steps, _ = self.trace_loop()
+        return steps // 2
 
     def num_enclosed(self):
         """ Return the number of positions that are actually enclosed by the loop. """
 
-        candidates = [pair for pair in self.coordinate_pairs() if self.is_inside_boundary(pair)]
-        enclosed = 0
-        for candidate in candidates:
-            # Shoot a ray in any direction, and count whether it crosses the pipe an odd or even number of times.
-            # Odd = enclosed, even = not enclosed.
-            x, y = candidate
-            if sum(1 for cell in self.row(y)[x+1:] if cell.part_of_main_loop and cell.ch in '|F7') % 2 == 1:
-                enclosed += 1
-
-        return enclosed
+        # Pick's theorem: area = interior points + boundary points / 2 - 1, and every loop step is one boundary point
+        steps, area = self.trace_loop()
+        return (abs(area) - steps) // 2 + 1
 
-def solve(lines):
-    grid = PipeGrid(lines, wrapping=False, default_value=None)
+def solve(grid):
     most_steps = grid.most_steps()
     num_enclosed = grid.num_enclosed()
 
     return (most_steps, num_enclosed)
 
 if __name__=='__main__':
-    main_problem = open('data/day10.txt').read()
-    lines = main_problem.splitlines()
-
-    part1, part2 = solve(lines)
+    grid = PipeGrid.from_file('data/day10.txt', wrapping=False, default_value=None)
+    part1, part2 = solve(grid)
     print(f"Part 1: {part1}")
     print(f"Part 2: {part2}")
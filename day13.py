@@ -1,43 +1,49 @@
-import itertools
 from common import CharacterGrid
 
-def find_reflection(line_func, line_count, smudge = False):
-    def differences(line_a, line_b):
-        """ How many characters differ in these strings? """
-        return len(line_a) - sum(1 for i in range(len(line_a)) if line_a[i] == line_b[i])
-
-    for reflection_line in range(1, line_count):
-        misses = 0
-        for offset in range(0, line_count // 2):
-            a = reflection_line - offset - 1
-            b = reflection_line + offset
-            if a >= 0 and b < line_count:
-                line_a = line_func(a)
-                line_b = line_func(b)
-                if smudge and differences(line_a, line_b) == 1:
-                    # This didn't match, but there was exactly one single mismatch so far, so keep going
-                    misses += 1
-                elif line_a != line_b:
-                    break
+# Translates a row of the pattern into a binary number: '#' => '1', anything else => '0'
+BITS = bytes(ord('1') if b == ord('#') else ord('0') for b in range(256))
+
+def line_bytes(line):
+    # Rows and columns are memoryviews for an ArrayCharacterGrid, and lists of characters for a CharacterGrid
+    return bytes(line) if isinstance(line, memoryview) else ''.join(line).encode('latin-1')
+
+def encode_lines(lines):
+    """ One integer bitmask per row (or column) """
+    return [int(line_bytes(line).translate(BITS), 2) for line in lines]
+
+def encode_patterns(grids):
+    """ Encode every pattern once, as (row bitmasks, column bitmasks) """
+    return [(encode_lines(grid.rows()), encode_lines(grid.cols())) for grid in grids]
+
+def find_reflection(lines, smudge = False):
+    """ Find the reflection line, given one bitmask per row or column; returns the number of lines before it, or 0.
+        With smudge = True, exactly one cell must differ between the two sides. """
+    allowed_differences = 1 if smudge else 0
+    for reflection_line in range(1, len(lines)):
+        differences = 0
+        for offset in range(min(reflection_line, len(lines) - reflection_line)):
+            differences += (lines[reflection_line - offset - 1] ^ lines[reflection_line + offset]).bit_count()
+            if differences > allowed_differences:
+                break
         else:
             # The loop finished without breaking, so this could be a match
-            if not smudge or misses == 1:
+            if differences == allowed_differences:
                 return reflection_line
 
     return 0
 
-def solve(grids, smudge):
+def solve(patterns, smudge):
     sum = 0
-    for grid in grids:
-        sum += 100 * (reflection_line := find_reflection(grid.row, grid.row_count, smudge))
+    for rows, cols in patterns:
+        sum += 100 * (reflection_line := find_reflection(rows, smudge))
         if reflection_line == 0:
-            sum += find_reflection(grid.col, grid.col_count, smudge)
+            sum += find_reflection(cols, smudge)
 
     return sum
 
 if __name__=='__main__':
-    lines = open('data/day13.txt').read().splitlines()
-    grids = [CharacterGrid(list(g), default_value=None) for k, g in itertools.groupby(lines, bool) if k]
+    grids = CharacterGrid.grids_from_file('data/day13.txt', mmap=True, default_value=None)
+    patterns = encode_patterns(grids)
 
-    print(f"Part 1: {solve(grids, smudge=False)}")
-    print(f"Part 2: {solve(grids, smudge=True)}")
\ No newline at end of file
+    print(f"Part 1: {solve(patterns, smudge=False)}")
+    print(f"Part 2: {solve(patterns, smudge=True)}")
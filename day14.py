@@ -1,51 +1,125 @@
-# pyright: reportOptionalMemberAccess=false
-import itertools
-from common import CharacterGrid
+from common import ArrayCharacterGrid, state_after, zobrist_key
 
-class StoneGrid(CharacterGrid):
-    def tilt(self):
-        for x in range(self.col_count):
-            groups = [list(g) for _, g in itertools.groupby(self.col(x), lambda cell: cell != '#')]
-            groups = [sorted(group, reverse=True) for group in groups]
-            new_col = itertools.chain.from_iterable(groups) # flatten
+def transpose_bits(masks, width):
+    """ Transpose a bit matrix: bit j of masks[i] becomes bit i of result[j] """
+    # Bit strings are written least significant bit first, so that character j is bit j
+    strings = [format(mask, f'0{width}b')[::-1] for mask in masks]
+    return [int(''.join(reversed(bits)) or '0', 2) for bits in zip(*strings)] if strings else [0] * width
 
-            for y, cell in enumerate(new_col):
-                self.data[y][x] = cell
+def segments(cubes, length):
+    """ Split a line into the runs between cube rocks. Returns a list of (mask, start, end) with end exclusive. """
+    result = []
+    start = 0
+    # Visit the cube rocks lowest bit first, then the end of the line
+    while start < length:
+        end = (cubes & -cubes).bit_length() - 1 if cubes else length
+        cubes &= cubes - 1
+        if end > start:
+            result.append((((1 << (end - start)) - 1) << start, start, end))
+        start = end + 1
+    return result
+
+class RockBoard:
+    """ Round rocks stored twice: as one integer bitmask per row (bit x) and as one per column (bit y).
+
+        Each tilt works segment by segment between the precomputed cube rock positions: the round rocks in a segment
+        are counted with a popcount and packed against one end, so no rotation is needed. The packed runs also give
+        the masks across the tilt: a run over rows start .. start + count - 1 of column x toggles bit x at rows start
+        and start + count, and XOR-ing those toggles row by row rebuilds every row mask. The north beam load only
+        changes on north/south tilts and is updated from the segment counts as they are packed. """
+    def __init__(self, grid):
+        self.row_count = grid.row_count
+        self.col_count = grid.col_count
+
+        rows = grid.match_mask(lambda c: c == 'O')
+        cube_rows = grid.match_mask(lambda c: c == '#')
+        cube_cols = transpose_bits(cube_rows, self.col_count)
+
+        self.row_segments = [segments(cubes, self.col_count) for cubes in cube_rows]
+        self.col_segments = [segments(cubes, self.row_count) for cubes in cube_cols]
+
+        self.rows = [0] * self.row_count
+        # Zobrist hash of the row masks, kept up to date by set_row; the columns follow from the rows. zobrist_key
+        # hashes the exact bits of each mask, so rows that differ anywhere (not just modulo 2**61 - 1) get
+        # different keys, and state_after can't mistake two boards for a cycle.
+        self.key = 0
+        for y, mask in enumerate(rows):
+            self.set_row(y, mask)
+        self.cols = transpose_bits(rows, self.col_count)
+        self.load = sum((self.row_count - y) * mask.bit_count() for y, mask in enumerate(rows))
+
+    def set_row(self, y, mask):
+        if self.rows[y] != mask:
+            self.key ^= zobrist_key(y, self.rows[y]) ^ zobrist_key(y, mask)
+            self.rows[y] = mask
+
+    @staticmethod
+    def pack(lines, line_segments, towards_start, across_count):
+        """ Pack the rocks in every segment against its start or end. Returns the packed lines, the masks across
+            them (rebuilt from the packed runs) and the load the rocks put on the edge where each line starts. """
+        packed_lines = []
+        toggles = [0] * (across_count + 1)
+        load = 0
+        for i, line in enumerate(lines):
+            bit = 1 << i
+            packed = 0
+            for mask, start, end in line_segments[i]:
+                if count := (line & mask).bit_count():
+                    start = start if towards_start else end - count
+                    packed |= ((1 << count) - 1) << start
+                    toggles[start] ^= bit
+                    toggles[start + count] ^= bit
+                    # Load of positions start .. start + count - 1
+                    load += count * (across_count - start) - count * (count - 1) // 2
+            packed_lines.append(packed)
+
+        across = []
+        mask = 0
+        for toggle in toggles[:across_count]:
+            mask ^= toggle
+            across.append(mask)
+        return (packed_lines, across, load)
+
+    def tilt_vertical(self, north):
+        self.cols, rows, self.load = RockBoard.pack(self.cols, self.col_segments, north, self.row_count)
+        for y, mask in enumerate(rows):
+            self.set_row(y, mask)
+
+    def tilt_horizontal(self, west):
+        # Rocks stay in their rows, so the north load doesn't change
+        rows, self.cols, _ = RockBoard.pack(self.rows, self.row_segments, west, self.col_count)
+        for y, mask in enumerate(rows):
+            self.set_row(y, mask)
+
+    def tilt_north(self): self.tilt_vertical(north=True)
+    def tilt_south(self): self.tilt_vertical(north=False)
+    def tilt_west(self): self.tilt_horizontal(west=True)
+    def tilt_east(self): self.tilt_horizontal(west=False)
 
     def perform_cycle(self):
-        for _ in range(4):
-            self.tilt()
-            self.rotate()
+        self.tilt_north()
+        self.tilt_west()
+        self.tilt_south()
+        self.tilt_east()
+        return self
 
-    def north_beam_load(self):
-        return sum((self.row_count - y) * [c for c in self.row(y)].count('O') for y in range(self.row_count))
+    def fingerprint(self):
+        return self.key
 
-def solve(lines):
+def solve(grid):
     # Part 1
-    grid = StoneGrid(lines)
-    grid.tilt()
-    part1 = grid.north_beam_load()
+    board = RockBoard(grid)
+    board.tilt_north()
+    part1 = board.load
 
     # Part 2
-    grid = StoneGrid(lines)
-    seen_grids = []
-
-    for i in range(1_000_000_000):
-        seen_grids.append(grid.dump())
-        grid.perform_cycle()
-
-        dump = grid.dump()
-        if dump in seen_grids:
-            prev_index = seen_grids.index(dump) - 1
-            cycle_length = i - prev_index
-            answer_index = prev_index + ((1_000_000_000_000) - prev_index) % cycle_length
-            part2 = StoneGrid(seen_grids[answer_index].splitlines()).north_beam_load()
+    board = state_after(RockBoard(grid), RockBoard.perform_cycle, 1_000_000_000, RockBoard.fingerprint)
+    part2 = board.load
 
-            return (part1, part2)
+    return (part1, part2)
 
 if __name__=='__main__':
-    lines = open('data/day14.txt').read().splitlines()
-    print("This will take a while...")
-    part1, part2 = solve(lines) # type: ignore
+    grid = ArrayCharacterGrid.from_file('data/day14.txt')
+    part1, part2 = solve(grid)
     print(f"Part 1: {part1}")
-    print(f"Part 2: {part2}")
\ No newline at end of file
+    print(f"Part 2: {part2}")
@@ -1,6 +1,5 @@
-from collections import namedtuple
-
-Lens = namedtuple('Lens', ['label', 'focal_length'])
+# Transition table for the HASH state machine: HASH_TABLE[state << 8 | byte] is the next state
+HASH_TABLE = bytes(((state + byte) * 17) % 256 for state in range(256) for byte in range(256))
 
 def hash(s):
     val = 0
@@ -10,38 +9,75 @@ def hash(s):
         val %= 256
     return val
 
+def hash_bytes(b):
+    """ HASH of a bytes-like label, one table lookup per byte """
+    val = 0
+    for byte in b:
+        val = HASH_TABLE[val << 8 | byte]
+    return val
+
+def hash_many(labels):
+    """ HASH many labels at once; returns one byte (the hash) per label.
+
+        Every label gets a 16-bit lane in one big integer, and each character position is processed for all labels
+        with a single add, multiply and mask. Lanes never overflow ((255 + 255) * 17 < 65536), so they don't interfere.
+        Shorter labels are padded with leading zero bytes, which leave the initial state 0 unchanged. """
+    if not labels:
+        return b''
+    count = len(labels)
+    width = max(len(label) for label in labels)
+    padded = b''.join(label.rjust(width, b'\0') for label in labels)
+
+    lane_mask = int.from_bytes(b'\x00\xff' * count, 'big')
+    lanes = bytearray(2 * count)
+    state = 0
+    for position in range(width):
+        lanes[1::2] = padded[position::width]
+        state = ((state + int.from_bytes(lanes, 'big')) * 17) & lane_mask
+    return state.to_bytes(2 * count, 'big')[1::2]
+
+def iter_step_batches(f, chunk_size = 1 << 20):
+    """ Read an initialization sequence from a binary file in chunks, and yield the steps of each chunk as a list of
+        bytes. Newlines are dropped, and a step split across two chunks is carried over to the next batch. """
+    leftover = b''
+    while chunk := f.read(chunk_size):
+        steps = (leftover + chunk.translate(None, b'\n')).split(b',')
+        leftover = steps.pop()
+        if steps:
+            yield steps
+    if leftover:
+        yield [leftover]
+
+def hash_sum(f, chunk_size = 1 << 20):
+    """ Sum of the HASH of every step in a file, streamed with bounded memory """
+    return sum(sum(hash_many(steps)) for steps in iter_step_batches(f, chunk_size))
+
 def solve(steps):
     # Part 1
-    init_sequence_sum = sum(hash(step) for step in steps)
+    init_sequence_sum = sum(hash_many(steps))
 
     # Part 2
-    boxes = [[] for _ in range(256)]
+    # Each box maps label => focal length. Dicts keep insertion order, and replacing the value of an existing key
+    # keeps its position, so every step is O(1) no matter how many lenses share a box.
+    boxes = [{} for _ in range(256)]
     for step in steps:
-        if '=' in step:
-            label, focal_length = step.split('=')
-            box = hash(label)
-            new_lens = Lens(label, int(focal_length))
-
-            for i, lens in enumerate(boxes[box]):
-                if lens.label == new_lens.label:
-                    boxes[box][i] = new_lens
-                    break
-            else:
-                boxes[box].append(new_lens)
-        elif '-' in step:
+        if b'=' in step:
+            label, focal_length = step.split(b'=')
+            boxes[hash_bytes(label)][label] = int(focal_length)
+        elif b'-' in step:
             label = step[:-1]
-            box = hash(label)
-            boxes[box] = [lens for lens in boxes[box] if lens.label != label]
+            boxes[hash_bytes(label)].pop(label, None)
 
     focusing_power = 0
     for box_id, box in enumerate(boxes, start=1):
-        for lens_id, lens in enumerate(box, start=1):
-            focusing_power += box_id * lens_id * lens.focal_length
+        for lens_id, focal_length in enumerate(box.values(), start=1):
+            focusing_power += box_id * lens_id * focal_length
 
     return (init_sequence_sum, focusing_power)
 
 if __name__=='__main__':
-    steps = open('data/day15.txt').read().replace('\n', '').split(',')
+    with open('data/day15.txt', 'rb') as f:
+        steps = [step for batch in iter_step_batches(f) for step in batch]
     part1, part2 = solve(steps)
     print(f"Part 1: {part1}")
-    print(f"Part 2: {part2}")
\ No newline at end of file
+    print(f"Part 2: {part2}")
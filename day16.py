@@ -1,5 +1,11 @@
+import itertools
+import operator
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
 from enum import Enum
-from common import CharacterGrid
+from multiprocessing import shared_memory
+from common import ArrayCharacterGrid
 
 class Dir(Enum):
     N = (0, -1)
@@ -42,21 +48,272 @@ def follow_beam(grid, starting_state, visited = None, depth = 0):
     else:
         return 0
 
-def solve(lines):
-    grid = CharacterGrid(lines, wrapping=False, default_value='.')
-    state = (0, 0, Dir.E)
-    part1 = follow_beam(grid, state)
+# Directions as indices into these tables, clockwise from north
+N, E, S, W = range(4)
+DIR_INDEX = {Dir.N: N, Dir.E: E, Dir.S: S, Dir.W: W}
+DX = (0, 1, 0, -1)
+DY = (-1, 0, 1, 0)
 
-    starts = [(x, 0, Dir.S) for x in range(grid.col_count)]
-    starts += [(x, grid.row_count - 1, Dir.N) for x in range(grid.col_count)]
-    starts += [(0, y, Dir.E) for y in range(grid.row_count)]
-    starts += [(grid.col_count - 1, y, Dir.W) for y in range(grid.row_count)]
-    part2 = max(follow_beam(grid, s) for s in starts)
+# Outgoing directions for a beam entering an optical element in each direction (N, E, S, W).
+# None means that the element doesn't affect the beam, i.e. a splitter hit from the side.
+DEFLECTIONS = {
+    '/': ((E,), (N,), (W,), (S,)),
+    '\\': ((W,), (S,), (E,), (N,)),
+    '-': ((E, W), None, (E, W), None),
+    '|': (None, (N, S), None, (N, S)),
+}
+
+# DEFLECTIONS by byte value, for tracing beams straight from a grid's buffer
+BYTE_DEFLECTIONS = [DEFLECTIONS.get(chr(b), (None,) * 4) for b in range(256)]
+
+def trace_beam(grid, starting_state):
+    """ Like follow_beam, but with an explicit stack of split beams instead of recursion, and reading the bytes of
+        an ArrayCharacterGrid directly. States are packed as (cell * 4 + direction). """
+    view, offset, row_stride, col_stride = grid.view, grid.offset, grid.row_stride, grid.col_stride
+    row_count, col_count = grid.row_count, grid.col_count
+    x, y, dir = starting_state
+    beams = [(x, y, DIR_INDEX[dir])]
+    visited = set()
+    while beams:
+        x, y, d = beams.pop()
+        while 0 <= x < col_count and 0 <= y < row_count and (state := (y * col_count + x) * 4 + d) not in visited:
+            visited.add(state)
+            if (outgoing := BYTE_DEFLECTIONS[view[offset + y * row_stride + x * col_stride]][d]) is not None:
+                d = outgoing[0]
+                if len(outgoing) == 2:
+                    # Split: follow the other beam later
+                    beams.append((x + DX[outgoing[1]], y + DY[outgoing[1]], outgoing[1]))
+            x += DX[d]
+            y += DY[d]
+
+    return len({state >> 2 for state in visited})
+
+class BeamGraph:
+    """ All beam paths through a grid, precomputed once.
+
+        A node is a beam entering an optical element from a given direction. The jump table gives, for every cell and
+        direction, the next element that would change a beam's course, so each node has one or two outgoing edges
+        along with the cells they pass. Cycles of nodes are condensed into strongly connected components, and the
+        energized cells reachable from each component are computed once, as a bitset, and shared by every start. """
+    def __init__(self, grid):
+        self.lines = lines = [bytes(row).decode('latin-1') for row in grid.rows()]
+        self.row_count = grid.row_count
+        self.col_count = grid.col_count
+        self.jump = [self.build_jump_table(d) for d in range(4)]
+
+        # One bit in every row of a column (bits 0, col_count, 2 * col_count, ...); column segments are cut from it
+        self.column_mask = ((1 << (self.row_count * self.col_count)) - 1) // ((1 << self.col_count) - 1) if lines else 0
+
+        # Build the graph: node = cell * 4 + incoming direction. The cells on each edge are found again when needed.
+        self.successors = {}
+        for y, line in enumerate(lines):
+            for x, ch in enumerate(line):
+                for d in range(4):
+                    if (outgoing := self.deflections(x, y, d)) is None:
+                        continue
+                    targets = (self.jump[o][y * self.col_count + x] for o in outgoing)
+                    self.successors[(y * self.col_count + x) * 4 + d] = [t * 4 + o for t, o in zip(targets, outgoing) if t != -1]
+
+    def deflections(self, x, y, d):
+        """ Outgoing directions if the cell at (x, y) changes the course of a beam moving in direction d, else None """
+        return DEFLECTIONS.get(self.lines[y][x], (None,) * 4)[d]
+
+    def build_jump_table(self, d):
+        """ jump[y * col_count + x]: the next cell after (x, y) in direction d that affects the beam, or -1 for none """
+        jump = [-1] * (self.row_count * self.col_count)
+        # Walk each line backwards, against the direction of travel, remembering the last element seen
+        if DX[d] != 0:
+            lines = [[(x, y) for x in range(self.col_count)] for y in range(self.row_count)]
+        else:
+            lines = [[(x, y) for y in range(self.row_count)] for x in range(self.col_count)]
+        for line in lines:
+            following = -1
+            for (x, y) in (line if DX[d] + DY[d] < 0 else reversed(line)):
+                jump[y * self.col_count + x] = following
+                if self.deflections(x, y, d) is not None:
+                    following = y * self.col_count + x
+        return jump
+
+    def segment(self, x, y, d, target):
+        """ Bitset of the cells from (x, y) to the target cell (or the edge, if target is -1) in direction d """
+        if target == -1:
+            end_x = {E: self.col_count - 1, W: 0}.get(d, x)
+            end_y = {S: self.row_count - 1, N: 0}.get(d, y)
+        else:
+            end_x, end_y = target % self.col_count, target // self.col_count
+        (x0, x1), (y0, y1) = sorted((x, end_x)), sorted((y, end_y))
+        if y0 == y1:
+            return ((1 << (x1 - x0 + 1)) - 1) << (y0 * self.col_count + x0)
+        return (self.column_mask & ((1 << ((y1 - y0) * self.col_count + 1)) - 1)) << (y0 * self.col_count + x0)
+
+    def node_cells(self, node):
+        """ Bitset of the cells energized by the outgoing edges of a node """
+        cell, d = divmod(node, 4)
+        y, x = divmod(cell, self.col_count)
+        cells = 0
+        for o in self.deflections(x, y, d):
+            cells |= self.segment(x, y, o, self.jump[o][cell])
+        return cells
+
+    def entry(self, starting_state):
+        """ The first node a beam starting at (x, y), moving in direction dir, reaches, along with the cells it passes
+            on the way there as (x, y, d, target); target is -1 if the beam leaves the grid without reaching a node """
+        x, y, dir = starting_state
+        d = DIR_INDEX[dir]
+        cell = y * self.col_count + x
+        if self.deflections(x, y, d) is not None:
+            return (cell * 4 + d, None)
+        target = self.jump[d][cell]
+        return (target * 4 + d if target != -1 else None, (x, y, d, target))
+
+    def condense(self, roots):
+        """ Tarjan's algorithm, iteratively, over the nodes reachable from the roots. Returns the component of each of
+            those nodes and the members of each component. Components are found successors-first. """
+        component = {}
+        members = []
+        index = {}
+        low = {}
+        stack = []
+        for root in roots:
+            if root in index:
+                continue
+            index[root] = low[root] = len(index)
+            stack.append(root)
+            work = [(root, iter(self.successors[root]))]
+            while work:
+                node, children = work[-1]
+                for child in children:
+                    if child not in index:
+                        index[child] = low[child] = len(index)
+                        stack.append(child)
+                        work.append((child, iter(self.successors[child])))
+                        break
+                    elif child not in component:
+                        # Still on the stack
+                        low[node] = min(low[node], index[child])
+                else:
+                    work.pop()
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[node])
+                    if low[node] == index[node]:
+                        members.append([])
+                        while True:
+                            member = stack.pop()
+                            component[member] = len(members) - 1
+                            members[-1].append(member)
+                            if member == node:
+                                break
+        return component, members
+
+    def energized_counts(self, starts):
+        """ Number of energized cells for each (x, y, dir) start.
+
+            Only the components that some start reaches are condensed. Their reach bitsets are built successors-first,
+            each start is answered as soon as the component it enters is done, and a component's bitset is dropped
+            once all of its predecessors have used it, so only the frontier of the condensed graph is kept. """
+        counts = [0] * len(starts)
+        waiting = {} # Entry node => [(start index, cells on the way there)]
+        for i, start in enumerate(starts):
+            node, lead_in = self.entry(start)
+            if node is None:
+                counts[i] = self.segment(*lead_in).bit_count()
+            else:
+                waiting.setdefault(node, []).append((i, lead_in))
+
+        component, members = self.condense(waiting)
+
+        # The successor components of each component, and how many predecessors will still need each one's reach
+        successor_components = []
+        users = [0] * len(members)
+        for c, nodes in enumerate(members):
+            successor_components.append({component[child] for node in nodes for child in self.successors[node]} - {c})
+            for s in successor_components[c]:
+                users[s] += 1
+
+        reach = {}
+        for c, nodes in enumerate(members):
+            cells = 0
+            for node in nodes:
+                cells |= self.node_cells(node)
+            for s in successor_components[c]:
+                cells |= reach[s]
+                users[s] -= 1
+                if users[s] == 0:
+                    del reach[s]
+            for node in nodes:
+                for i, lead_in in waiting.get(node, ()):
+                    counts[i] = (cells | self.segment(*lead_in)).bit_count() if lead_in else cells.bit_count()
+            if users[c] > 0:
+                reach[c] = cells
+        return counts
+
+    def energized(self, starting_state):
+        """ Number of energized cells for a beam starting at (x, y), moving in direction dir """
+        return self.energized_counts([starting_state])[0]
+
+def edge_starts(row_count, col_count):
+    starts = [(x, 0, Dir.S) for x in range(col_count)]
+    starts += [(x, row_count - 1, Dir.N) for x in range(col_count)]
+    starts += [(0, y, Dir.E) for y in range(row_count)]
+    starts += [(col_count - 1, y, Dir.W) for y in range(row_count)]
+    return starts
+
+# The shared memory and grid each worker process traces beams in; set up once per process by init_sweep_worker
+worker_shm = None
+worker_grid = None
+
+def init_sweep_worker(shared_memory_name, row_count, col_count):
+    global worker_shm, worker_grid
+    worker_shm = shared_memory.SharedMemory(name=shared_memory_name)
+    worker_grid = ArrayCharacterGrid.from_buffer(worker_shm.buf, row_count, col_count, default_value='.')
+
+def sweep_batch(starts):
+    return max(((trace_beam(worker_grid, s), s) for s in starts), key=operator.itemgetter(0))
+
+def parallel_sweep(grid, workers = None, batch_size = None):
+    """ Trace every edge start with trace_beam on a pool of worker processes, which all read the grid from one
+        block of shared memory. Returns (most energized cells, the start that gave it), or (0, None) if the grid is
+        empty. """
+    workers = workers or os.cpu_count() or 1
+    row_count, col_count = grid.row_count, grid.col_count
+    starts = edge_starts(row_count, col_count)
+    if not starts:
+        return (0, None)
+    batch_size = batch_size or max(1, len(starts) // (workers * 4))
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, row_count * col_count))
+    try:
+        shm.buf[:row_count * col_count] = b''.join(bytes(row) for row in grid.rows())
+        with ProcessPoolExecutor(workers, initializer=init_sweep_worker, initargs=(shm.name, row_count, col_count)) as pool:
+            results = pool.map(sweep_batch, itertools.batched(starts, batch_size))
+            return max(results, key=operator.itemgetter(0))
+    finally:
+        shm.close()
+        shm.unlink()
+
+def solve(grid, parallel = False, workers = None):
+    """ With parallel = True, part 2 traces every edge start separately with parallel_sweep, on workers processes
+        (default: one per CPU). Otherwise, all starts share one BeamGraph. """
+    if parallel:
+        part1 = trace_beam(grid, (0, 0, Dir.E)) if grid.row_count and grid.col_count else 0
+        part2, _ = parallel_sweep(grid, workers)
+        return (part1, part2)
+
+    graph = BeamGraph(grid)
+    starts = edge_starts(graph.row_count, graph.col_count)
+    counts = graph.energized_counts(starts)
+    part1 = counts[starts.index((0, 0, Dir.E))] if starts else 0
+    part2 = max(counts, default=0)
 
     return (part1, part2)
 
 if __name__=='__main__':
-    lines = open('data/day16.txt').read().splitlines()
-    part1, part2 = solve(lines)
+    # Usage: day16.py [--parallel [workers]]
+    parallel = sys.argv[1:2] == ['--parallel']
+    workers = int(sys.argv[2]) if parallel and len(sys.argv) > 2 else None
+
+    grid = ArrayCharacterGrid.from_file('data/day16.txt')
+    part1, part2 = solve(grid, parallel, workers)
     print(f"Part 1: {part1}")
     print(f"Part 2: {part2}")
\ No newline at end of file
@@ -1,6 +1,4 @@
-# pyright: reportOptionalMemberAccess=false
 import re
-import itertools
 
 class Dig:
     dir: str
@@ -10,41 +8,56 @@ class Dig:
         self.dir = dir
         self.length = int(length)
 
-def calculate_num_blocks(digs):
-    # Generate a list of vertices for the polygon
-    (x, y) = (0, 0)
-    vertices = [(0, 0)]
-    for dig in digs:
+class DigArea:
+    """ Takes a dig plan one instruction at a time, keeping only the current vertex, the shoelace sum and the
+        perimeter, all as exact integers. """
+    def __init__(self):
+        (self.x, self.y) = (0, 0)
+        self.shoelace = 0 # Twice the signed area
+        self.perimeter = 0
+
+    def add(self, dig):
+        (x, y) = (self.x, self.y)
         match dig.dir:
             case 'L': x -= dig.length
             case 'R': x += dig.length
             case 'U': y -= dig.length
             case 'D': y += dig.length
-        vertices.append((x, y))
 
-    # Triangle formula, related to the Shoelace formula
-    area = 0.5 * abs(sum( (a[1] + b[1]) * (a[0] - b[0]) for a, b in itertools.pairwise(vertices) ))
+        # Triangle formula, related to the Shoelace formula
+        self.shoelace += (self.y + y) * (self.x - x)
+        self.perimeter += dig.length
+        (self.x, self.y) = (x, y)
+
+    def num_blocks(self):
+        # Pick's Theorem: "Pick's theorem provides a formula for the area of a simple polygon with integer vertex coordinates, in terms of the number of integer points within it and on its boundary"
+        # Area of polygon = # interior points + (boundary points)/2 - 1
+        # We know the area (above), and want the total number of points (internal and boundary), so solve the equation for i + b:
+        # A = i + b/2 - 1 ==> i = A - b/2 + 1 ==> i + b = A + b/2 + 1
+        # 2A + b is always even for a closed lattice polygon, so this is exact.
+        return (abs(self.shoelace) + self.perimeter) // 2 + 1
+
+def calculate_num_blocks(digs):
+    area = DigArea()
+    for dig in digs:
+        area.add(dig)
+    return area.num_blocks()
+
+DIG_REGEX = re.compile(r'(\w) (\d+) \(#([0-9a-fA-F]{5})([0-3])\)')
+DIR_MAP = {'0': 'R', '1': 'D', '2': 'L', '3': 'U'}
 
-    # Pick's Theorem: "Pick's theorem provides a formula for the area of a simple polygon with integer vertex coordinates, in terms of the number of integer points within it and on its boundary"
-    # Area of polygon = # interior points + (boundary points)/2 - 1
-    # We know the area (above), and want the total number of points (internal and boundary), so solve the equation for i + b:
-    # A = i + b/2 - 1 ==> i = A - b/2 + 1 ==> i + b = A + b/2 + 1
-    b = sum(dig.length for dig in digs)
-    return int(area + b/2 + 1)
+def parse_dig_plan(lines):
+    """ Lazily parse the lines of a dig plan; yields (part 1 dig, part 2 dig) for each line """
+    for line in lines:
+        dir, length, color_length, color_dir = DIG_REGEX.match(line).groups() # type: ignore
+        yield (Dig(dir, length), Dig(DIR_MAP[color_dir], int(color_length, base=16)))
 
 if __name__=='__main__':
-    lines = open('data/day18.txt').read().splitlines()
-    dig_regex = re.compile(r'(\w) (\d+)')
-    color_regex = re.compile(r'#([0-9a-fA-F]{6})')
-    digs_part1 = [Dig(*re.match(dig_regex, line).groups()) for line in lines]
-
-    digs_part2 = []
-    colors = color_regex.findall('\n'.join(lines))
-    dir_map = {'0': 'R', '1': 'D', '2': 'L', '3': 'U'}
-    for color in colors:
-        dir = dir_map[color[-1]]
-        length = int(color[:5], base=16)
-        digs_part2.append(Dig(dir, length))
-
-    print(f"Part 1: {calculate_num_blocks(digs_part1)}")
-    print(f"Part 2: {calculate_num_blocks(digs_part2)}")
\ No newline at end of file
+    part1, part2 = DigArea(), DigArea()
+    with open('data/day18.txt') as f:
+        for dig_part1, dig_part2 in parse_dig_plan(f):
+            part1.add(dig_part1)
+            part2.add(dig_part2)
+
+    print(f"Part 1: {part1.num_blocks()}")
+    print(f"Part 2: {part2.num_blocks()}")
@@ -1,46 +1,72 @@
+import os
 import re
-import math
-from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
 
-lines = open('data/day2.txt', 'r').read().splitlines()
-
-GAME_REGEX = re.compile(r'[:;] ')
 COLOR_REGEX = re.compile(r'(\d+) (red|green|blue)')
 
 MAX_ALLOWED = {'red': 12, 'green': 13, 'blue': 14}
 
-game_id_sum = 0
-power_sum = 0
+def reduce_game(game):
+    """ Returns (possible, power) for one game line """
+    # The fewest cubes needed of each color is the largest count seen in any pick
+    min_required = {'red': 0, 'green': 0, 'blue': 0}
+    for count, color in COLOR_REGEX.findall(game):
+        min_required[color] = max(min_required[color], int(count))
 
-for game in lines:
-    id, *picks = GAME_REGEX.split(game)
-    id = int(id[5:])
-    game_possible = True
-    min_required = defaultdict(int)
+    # Part 1
+    possible = all(min_required[color] <= MAX_ALLOWED[color] for color in min_required)
 
-    for pick in picks:
-        color_map = defaultdict(int)
+    # Part 2
+    power = min_required['red'] * min_required['green'] * min_required['blue']
 
-        # Split picks into a list e.g. [(3, 'red'), (2, 'green')],
-        # and transform into a dict e.g. {'red': 3, 'green': 2}
-        for color_matches in COLOR_REGEX.findall(pick):
-            v, k = color_matches
-            color_map[k] = int(v)
+    return (possible, power)
 
-        # Part 1
-        if any(color_map[color] > MAX_ALLOWED[color] for color in ('red', 'green', 'blue')):
-            game_possible = False
+def reduce_lines(lines):
+    """ Returns (sum of IDs of the possible games, sum of powers) """
+    game_id_sum = 0
+    power_sum = 0
+    for game in lines:
+        if not game:
+            continue
+        possible, power = reduce_game(game)
+        if possible:
+            game_id_sum += int(game[5:game.index(':')])
+        power_sum += power
+    return (game_id_sum, power_sum)
 
-        # Part 2
-        min_required = {color: max(min_required[color], color_map[color]) for color in ('red', 'green', 'blue')}
-    
-    # Part 1
-    if game_possible:
-        game_id_sum += id
+def reduce_chunk(filename, start, end):
+    """ Reduce the games in bytes [start, end) of a file; start and end are at line boundaries """
+    with open(filename, 'rb') as f:
+        f.seek(start)
+        return reduce_lines(f.read(end - start).decode().splitlines())
 
-    # Part 2
-    power = math.prod(min_required.values())
-    power_sum += power
+def chunk_boundaries(filename, chunk_size):
+    """ Split a file into chunks of roughly chunk_size bytes, each ending just after a newline (or at the end) """
+    size = os.path.getsize(filename)
+    boundaries = [0]
+    with open(filename, 'rb') as f:
+        while boundaries[-1] + chunk_size < size:
+            f.seek(boundaries[-1] + chunk_size)
+            f.readline()
+            boundaries.append(min(f.tell(), size))
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return boundaries
+
+def solve(filename, workers = None, chunk_size = 64 << 20):
+    """ Map-reduce over line-aligned chunks of the file on a process pool; each worker only ever holds one chunk """
+    boundaries = chunk_boundaries(filename, chunk_size)
+    chunks = list(zip(boundaries, boundaries[1:]))
+
+    if len(chunks) <= 1 or workers == 1:
+        results = [reduce_chunk(filename, start, end) for start, end in chunks]
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            results = list(pool.map(reduce_chunk, [filename] * len(chunks), *zip(*chunks)))
+
+    return (sum(r[0] for r in results), sum(r[1] for r in results))
 
-print(f'Part 1: {game_id_sum}')
-print(f'Part 2: {power_sum}')
\ No newline at end of file
+if __name__=='__main__':
+    game_id_sum, power_sum = solve('data/day2.txt')
+    print(f'Part 1: {game_id_sum}')
+    print(f'Part 2: {power_sum}')
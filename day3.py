@@ -1,80 +1,75 @@
-from itertools import takewhile
-from common import CharacterGrid
+import re
+import array
+from common import ArrayCharacterGrid
 
-class GroupedCharacterGrid(CharacterGrid):
+NUMBER_REGEX = re.compile(rb'\d+')
+SYMBOL_REGEX = re.compile(rb'[^\d.]')
+
+class GroupedCharacterGrid(ArrayCharacterGrid):
     def __init__(self, lines):
         super().__init__(lines, wrapping = False, default_value = '.')
+        self.label_groups()
 
-        id = 1
-        self.groups = {}
-        self.coord_group_map = {}
-        for y in range(self.row_count):
-            # Ugly, ugly. I want a C-style for loop here (to easily skip multiple iterations with x += ...)
-            x = -1
-            while (x := x + 1) < self.col_count:
-                if not self.cell_at((x, y)).isdigit(): # type: ignore
-                    continue
+    @classmethod
+    def from_buffer(cls, *args, **kwargs):
+        # Grids loaded by from_file are created through here rather than __init__
+        grid = super().from_buffer(*args, **kwargs)
+        grid.label_groups()
+        return grid
+
+    def label_groups(self):
+        # The group ID of every cell (0 = not part of a number), in a flat array with an empty border of one cell
+        # all around, so that neighbors can be read without bounds checks
+        self.label_stride = self.col_count + 2
+        self.labels = array.array('I', bytes(4 * self.label_stride * (self.row_count + 2)))
 
-                # This is the first digit of a number; let's fetch the rest
-                digits = list(takewhile(lambda c: c.isdigit(), self.row(y)[x:]))
+        # The value of each group, indexed by ID. ID 0 is unused. A plain list, so that numbers of any size fit.
+        self.groups = [0]
 
-                # Store the group ID for each digit
-                for i in range(x, x+len(digits)):
-                    self.coord_group_map[(i, y)] = id
+        for y in range(self.row_count):
+            for match in NUMBER_REGEX.finditer(bytes(self.row(y))):
+                id = len(self.groups)
+                self.groups.append(int(match.group()))
+                start = self.label_index((match.start(), y))
+                self.labels[start:start + len(match.group())] = array.array('I', [id]) * len(match.group())
 
-                # Store them as a group
-                value = int("".join(digits))
-                self.groups[id] = value
-                x += len(digits)
-                id += 1
+    def label_index(self, coordinate):
+        (x, y) = coordinate
+        return (y + 1) * self.label_stride + x + 1
 
     def all_groups(self):
-        """ Returns a dictionary of all groups, with the id as the key """
+        """ Returns the values of all groups, with the id as the index """
         return self.groups
 
     def group_at_coordinate(self, coordinate):
-        return self.coord_group_map[coordinate]
+        return self.labels[self.label_index(coordinate)]
 
-def cell_contains_symbol(cell):
-    return cell and cell != '.' and not cell.isdigit()
+    def symbols_with_adjacent_groups(self):
+        """ Yields (symbol, set of adjacent group IDs) for every symbol in the grid """
+        offsets = [dy * self.label_stride + dx for dy in (-1, 0, 1) for dx in (-1, 0, 1) if dx or dy]
+        for y in range(self.row_count):
+            for match in SYMBOL_REGEX.finditer(bytes(self.row(y))):
+                center = self.label_index((match.start(), y))
+                group_ids = {self.labels[center + offset] for offset in offsets}
+                group_ids.discard(0)
+                yield (match.group(), group_ids)
 
 if __name__=='__main__':
-    lines = open('data/day3.txt').read().splitlines()
-    grid = GroupedCharacterGrid(lines)
-
-    # Calculate which groups/numbers have an adjacent symbol
-    groups_with_adjacent_symbol = set()
-    for y in range(grid.row_count):
-        for x in range(grid.col_count):
-            if (c := grid.cell_at((x, y))) and c.isdigit():
-                if any(cell_contains_symbol(cell) for cell in grid.neighbors((x, y))):
-                    # Digit has an adjacent symbol
-                    groups_with_adjacent_symbol.add(grid.group_at_coordinate((x,y)))
-
-    # Add up all groups/numbers with an adjacent symbol
-    sum = 0
-    for group_id, group_value in grid.all_groups().items():
-        if group_id in groups_with_adjacent_symbol:
-            sum += group_value
-
-    print(f"Part 1: {sum}")
-
-    # Part 2: locate all *, skip if there aren't exactly two groups adjacent, multiply the two values
-    sum = 0
+    grid = GroupedCharacterGrid.from_file('data/day3.txt', default_value = '.')
     all_groups = grid.all_groups()
-    for y in range(grid.row_count):
-        for x in range(grid.col_count):
-            if grid.cell_at((x, y)) == '*':
-                digit_coordinates = [pair for pair in grid.neighbor_coordinates((x, y)) if (c := grid.cell_at(pair)) and c.isdigit()]
-                group_ids = {grid.group_at_coordinate(coordinate) for coordinate in digit_coordinates}
-
-                # Skip if there aren't exactly two groups adjacent
-                if len(group_ids) != 2:
-                    continue
-
-                # Extract the two groups/numbers and multiply them
-                a, b = group_ids
-                ratio = all_groups[a] * all_groups[b]
-                sum += ratio
 
-    print(f"Part 2: {sum}")
\ No newline at end of file
+    # A single sweep over the symbols handles both parts
+    has_adjacent_symbol = bytearray(len(all_groups))
+    gear_ratio_sum = 0
+    for symbol, group_ids in grid.symbols_with_adjacent_groups():
+        # Part 1: mark every group/number next to a symbol
+        for group_id in group_ids:
+            has_adjacent_symbol[group_id] = 1
+
+        # Part 2: multiply the two values next to each *, skipping those that don't have exactly two groups adjacent
+        if symbol == b'*' and len(group_ids) == 2:
+            a, b = group_ids
+            gear_ratio_sum += all_groups[a] * all_groups[b]
+
+    print(f"Part 1: {sum(value for value, adjacent in zip(all_groups, has_adjacent_symbol) if adjacent)}")
+    print(f"Part 2: {gear_ratio_sum}")
@@ -2,33 +2,50 @@ import re
 
 NUMBER_REGEX = re.compile(r'\d+')
 
+# Numbers below this are kept as bits; larger ones go in a set, so that a single huge number can't blow up a bitset
+BITSET_LIMIT = 1024
+
+def number_bitset(s):
+    """ All numbers in a string as (bitset, set of large numbers): bit n is set if n < BITSET_LIMIT appears """
+    bits = 0
+    large = set()
+    for n in map(int, NUMBER_REGEX.findall(s)):
+        if n < BITSET_LIMIT:
+            bits |= 1 << n
+        else:
+            large.add(n)
+    return (bits, large)
+
+def count_matches(line):
+    _, winning, my = re.split('[:|]', line)
+    (winning_bits, winning_large), (my_bits, my_large) = number_bitset(winning), number_bitset(my)
+    return (winning_bits & my_bits).bit_count() + len(winning_large & my_large)
+
+def count_instances(match_counts):
+    """ Total number of cards after all copies are won, in O(cards) no matter how many copies there are.
+        Card i with m matches adds (copies of card i) to each of cards i+1..i+m, which is kept in a difference array. """
+    card_count = len(match_counts)
+    added = [0] * (card_count + 1) # added[i] - added[i - 1] = change in copies won, from card i onwards
+    won = 0
+    total = 0
+    for card, num_matches in enumerate(match_counts):
+        won += added[card]
+        copies = 1 + won
+        total += copies
+        if num_matches > 0:
+            added[card + 1] += copies
+            added[min(card + num_matches + 1, card_count)] -= copies
+    return total
+
 if __name__=='__main__':
     lines = open('data/day4.txt').read().splitlines()
 
-    card_match_count = {} # Map of card ID -> # of matching numbers on that card
-    card_instances = {} # Map of card ID -> # of copies we have of that card
-
-    # Parse cards and calculate score for part 1
-    score = 0
-    for line in lines:
-        card, winning, my = re.split('[:|]', line)
-        card_number = int(NUMBER_REGEX.search(card).group(0)) # type: ignore
-        winning_numbers = NUMBER_REGEX.findall(winning)
-        my_numbers = NUMBER_REGEX.findall(my)
-
-        num_matches = len(set(my_numbers) & set(winning_numbers))
-        card_match_count[card_number] = num_matches
-        card_instances[card_number] = 1
-        card_score = 2**(num_matches - 1) if num_matches > 0 else 0
-        score += card_score
-    
-    print(f"Part 1: {score}")
+    # Number of matching numbers on each card, in card order
+    match_counts = [count_matches(line) for line in lines]
 
-    # Calculate card instances for part 2
-    for card, num_matches in card_match_count.items():
-        for instance in range(card_instances[card]):
-            # num_matches matches gives one copy of each card in the range card + 1 to card + num_matches (inclusive)
-            for c in range(card + 1, card + num_matches + 1):
-                card_instances[c] += 1
+    # Part 1
+    score = sum(2**(num_matches - 1) for num_matches in match_counts if num_matches > 0)
+    print(f"Part 1: {score}")
 
-    print(f"Part 2: {sum(card_instances.values())}")
\ No newline at end of file
+    # Part 2
+    print(f"Part 2: {count_instances(match_counts)}")
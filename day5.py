@@ -1,5 +1,8 @@
 import re
+import array
+import bisect
 import operator
+import functools
 import itertools
 from dataclasses import dataclass
 
@@ -22,36 +25,94 @@ class Map:
     def __init__(self, mappings):
         self.mappings = sorted(mappings, key=operator.attrgetter("src"))
 
+        # Compile the mappings into a piecewise function covering every value from 0 and up, for binary searching:
+        # piece i covers [starts[i], starts[i + 1]) and adds offsets[i]. The gaps between mappings have offset 0.
+        self.starts = []
+        self.offsets = []
+        position = 0
+        for m in self.mappings:
+            if m.src > position:
+                self.add_piece(position, 0)
+            self.add_piece(m.src, m.offset)
+            position = m.src + m.length
+        self.add_piece(position, 0)
+
+    @classmethod
+    def from_pieces(cls, pieces):
+        """ Create a map directly from (start, offset) pieces, sorted by start, with the first starting at 0 """
+        m = cls([])
+        m.starts, m.offsets = [], []
+        for start, offset in pieces:
+            m.add_piece(start, offset)
+        return m
+
+    def add_piece(self, start, offset):
+        if self.starts and self.starts[-1] == start:
+            # The previous piece was empty
+            self.starts.pop()
+            self.offsets.pop()
+        if self.offsets and self.offsets[-1] == offset:
+            # Same offset as the previous piece, so just extend that one
+            return
+        self.starts.append(start)
+        self.offsets.append(offset)
+
+    def piece_index(self, value):
+        assert(value >= 0)
+        return bisect.bisect_right(self.starts, value) - 1
+
     def lookup(self, value):
         """ Convert a value by looking it up in the appropriate mapping. """
-        for m in self.mappings:
-            if value >= m.src and value < m.src + m.length:
-                return value + m.offset
-        return value
-    
+        return value + self.offsets[self.piece_index(value)]
+
+    def lookup_many(self, values):
+        """ Convert many values at once; returns an array('q'). The binary searches and additions all run inside
+            map(), so there is no Python-level loop over the values. values can be any iterable. """
+        # The values are read twice, so a generator or other one-shot iterator has to be collected first
+        if not isinstance(values, (list, tuple, array.array)):
+            values = list(values)
+        # bisect_right gives the index of the piece plus one, so shift the offsets to match
+        shifted_offsets = [0] + self.offsets
+        piece_offsets = map(shifted_offsets.__getitem__, map(functools.partial(bisect.bisect_right, self.starts), values))
+        return array.array('q', map(operator.add, values, piece_offsets))
+
     def overhead(self, value):
         """ How much higher could value be, and still fit within the same mapping? """
-
-        if value < self.mappings[0].src:
-            # Value is lower than all existing mappings. Return the distance up to the first mapping.
-            return self.mappings[0].src - value - 1
-        elif value >= self.mappings[-1].src + self.mappings[-1].length:
+        i = self.piece_index(value)
+        if i == len(self.starts) - 1:
             # Value is higher than all existing mappings. Overhead is infinite here.
             return float('inf')
-
-        # Handle the case where value falls into one of the mappings
-        for m in self.mappings:
-            if value >= m.src and value < m.src + m.length:
-                return m.src + m.length - value - 1
-
-        # Value must be in between two existing mappings.
-        # Find the first mapping that has src > value and return the distance to that.
-        for m in self.mappings:
-            if m.src > value:
-                return m.src - value
-
-        # Should never be reached!
-        assert(False)
+        return self.starts[i + 1] - value - 1
+
+    def then(self, other):
+        """ Compose two maps into one: the result maps a value as other.lookup(self.lookup(value)) would. """
+        pieces = []
+        for i, (start, offset) in enumerate(zip(self.starts, self.offsets)):
+            end = self.starts[i + 1] if i + 1 < len(self.starts) else None
+
+            # This piece maps [start, end) to [start + offset, end + offset); split that at the other map's breakpoints
+            j = other.piece_index(start + offset)
+            while True:
+                pieces.append((start, offset + other.offsets[j]))
+                if j + 1 == len(other.starts):
+                    break
+                start = other.starts[j + 1] - offset
+                if end is not None and start >= end:
+                    break
+                j += 1
+
+        return Map.from_pieces(pieces)
+
+    def min_in_range(self, first, length):
+        """ The lowest value that any value in [first, first + length) maps to """
+        i = self.piece_index(first)
+        end = first + length
+        lowest = first + self.offsets[i]
+        # Within a piece, the lowest value maps to the lowest result, so only the start of each piece matters
+        while i + 1 < len(self.starts) and self.starts[i + 1] < end:
+            i += 1
+            lowest = min(lowest, self.starts[i] + self.offsets[i])
+        return lowest
 
 @dataclass
 class SeedRange:
@@ -88,34 +149,25 @@ def location_from_seed(seed, maps):
         value = m.lookup(value)
     return value
 
+def locations_from_seeds(seeds, maps):
+    """ Batch version of location_from_seed: map a whole sequence of seeds through the composed maps """
+    return functools.reduce(Map.then, maps).lookup_many(seeds)
+
+def min_location_from_seeds(seeds, maps):
+    """ Returns (lowest location, index of the seed that maps to it) """
+    locations = locations_from_seeds(seeds, maps)
+    index = min(range(len(locations)), key=locations.__getitem__)
+    return (locations[index], index)
+
 if __name__=='__main__':
     (seeds, seed_ranges, maps) = parse_input('data/day5.txt')
 
     # Part 1
-    # Simply run location_from_seed on each seed, and pick the lowest value.
-    print(f"Part 1: {min([location_from_seed(seed, maps) for seed in seeds])}")
+    # Map all seeds to locations in one batch, and pick the lowest value.
+    print(f"Part 1: {min_location_from_seeds(seeds, maps)[0]}")
 
     # Part 2
-    # Calculate a set of seed ranges that all use the same "mapping path", so to speak.
-    # Only the lowest value in such a range could possibly yield the lowest possible
-    # location number, so after calculating the ranges, we only test the lowest/first value
-    # in each range.
-    seeds = []
-    for sr in seed_ranges:
-        max_overhead = 0
-        mapped_start = sr.start
-        for m in maps:
-            overhead = m.overhead(mapped_start)
-            max_overhead = min(overhead, max_overhead) if max_overhead > 0 else overhead
-
-            # Apply the offset from the map
-            mapped_start = m.lookup(mapped_start)
-
-        seeds.append(sr.start)
-
-        # If we didn't process the entire SeedRange, add the rest for later processing
-        if max_overhead < sr.length:
-            seed_ranges.append(SeedRange(sr.start + int(max_overhead) + 1, sr.length - int(max_overhead) - 1))
-
-    # We finally have the seed values. Map each of them to a location and extract the lowest value.
-    print(f"Part 2: {min([location_from_seed(seed, maps) for seed in seeds])}")
\ No newline at end of file
+    # Compose all maps into a single seed-to-location map. Each seed range then only has to be checked at its
+    # start and at every breakpoint of the composed map that falls within it.
+    seed_to_location = functools.reduce(Map.then, maps)
+    print(f"Part 2: {min(seed_to_location.min_in_range(sr.start, sr.length) for sr in seed_ranges)}")
@@ -1,4 +1,5 @@
 import re
+import math
 from dataclasses import dataclass
 
 @dataclass
@@ -7,13 +8,29 @@ class Race:
     record: int
 
 def ways_to_win_race(race):
-    ways_to_win = 0
-    for hold_time in range(1, race.length):
-        speed = hold_time # mm/s
-        length = speed * (race.length - hold_time)
-        if length > race.record:
-            ways_to_win += 1
-    return ways_to_win
+    """ Count the hold times h with h * (length - h) > record, i.e. the integers strictly between the roots of
+        h^2 - length * h + record = 0. Exact for arbitrarily large integers, since it only uses math.isqrt. """
+    t, r = race.length, race.record
+    discriminant = t * t - 4 * r
+    if discriminant < 0:
+        return 0
+
+    def wins(h):
+        return h * (t - h) > r
+
+    # Estimate the lowest winning hold time from the smaller root, then correct for the rounding of isqrt
+    low = max((t - math.isqrt(discriminant)) // 2, 1)
+    while low > 1 and wins(low - 1):
+        low -= 1
+    while low <= t // 2 and not wins(low):
+        low += 1
+
+    # The winning hold times are symmetric around t / 2
+    return max(t - 2 * low + 1, 0)
+
+def ways_to_win_races(races):
+    """ Batch version of ways_to_win_race; O(1) big-integer operations per race """
+    return [ways_to_win_race(race) for race in races]
 
 if __name__=='__main__':
     lines = open('data/day6.txt').read().splitlines()
@@ -24,9 +41,5 @@ if __name__=='__main__':
 
     part_2_race = Race(int("".join(times)), int("".join(records)))
 
-    prod = 1
-    for race in races:
-        prod *= ways_to_win_race(race)
-
-    print(f"Part 1: {prod}")
+    print(f"Part 1: {math.prod(ways_to_win_races(races))}")
     print(f"Part 2: {ways_to_win_race(part_2_race)}")
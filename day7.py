@@ -1,4 +1,3 @@
-import itertools
 from enum import IntEnum
 from dataclasses import dataclass
 
@@ -18,53 +17,57 @@ class HandType(IntEnum):
     FourOfAKind = 5
     FiveOfAKind = 6
 
+def partitions(n, largest = None):
+    """ All ways to split n cards into groups, as tuples of group sizes in descending order """
+    largest = n if largest is None else largest
+    if n == 0:
+        yield ()
+        return
+    for first in range(min(n, largest), 0, -1):
+        for rest in partitions(n - first, first):
+            yield (first,) + rest
+
+def build_hand_type_table():
+    """ Map (group sizes of the non-joker cards, number of jokers) => hand type, for every possible hand """
+    table = {}
+    for jokers in range(6):
+        for sizes in partitions(5 - jokers):
+            # Jokers always join the largest group
+            (first, second) = ((sizes[0] if sizes else 0) + jokers, sizes[1] if len(sizes) > 1 else 0)
+            if first == 5: hand_type = HandType.FiveOfAKind
+            elif first == 4: hand_type = HandType.FourOfAKind
+            elif first == 3 and second == 2: hand_type = HandType.FullHouse
+            elif first == 3: hand_type = HandType.ThreeOfAKind
+            elif first == 2 and second == 2: hand_type = HandType.TwoPair
+            elif first == 2: hand_type = HandType.OnePair
+            else: hand_type = HandType.HighCard
+            table[(sizes, jokers)] = hand_type
+    return table
+
+HAND_TYPES = build_hand_type_table()
+
+def hand_key(card_values, hand_type):
+    """ Pack a hand into one integer that sorts like the hand: the type, then five base-15 card digits """
+    key = hand_type
+    for value in card_values:
+        key = key * 15 + value
+    return key
+
 @dataclass
 class Hand:
     card_values: list[int]
     bid: int
     hand_type: HandType
+    key: int
 
     @classmethod
     def calculate_hand_type(cls, card_values, joker = False):
         jokers = card_values.count(1) if joker else 0
+        others = [v for v in card_values if v != 1] if jokers else card_values
 
-        # Groups a hand like [13, 13, 6, 7, 7] => [[6], [7, 7], [13, 13]]
-        grouped = [list(g) for k, g in itertools.groupby(sorted(card_values)) if not (joker and k == 1)]
-
-        # Sort by largest group first, highest value second; the above becomes [[13, 13], [7, 7], [6]]
-        grouped_sorted = sorted(grouped, key=lambda x: (len(x), x[0]), reverse=True)
-
-        # Handle jokers, if present. Increase the size of the largest (or highest-valued, if all are 1-sized) group.
-        # This maps e.g. [[12, 12], [4], [3]] => [[12, 12, 12], [4], [3]]
-        # ... since the jokers aren't in the grouped array.
-        if 0 < jokers < 5:
-            grouped_sorted[0] = [grouped_sorted[0][0]] * (len(grouped_sorted[0]) + jokers)
-
-        # Calculate the sizes of the two first groups (at most two groups are needed for a hand, except high card)
-        first_group = len(grouped_sorted[0]) if len(grouped_sorted) > 0 else 0
-        second_group = len(grouped_sorted[1]) if len(grouped_sorted) > 1 else 0
-
-        if first_group == 5 or jokers == 5:
-            hand_type = HandType.FiveOfAKind
-        elif first_group == 4:
-            hand_type = HandType.FourOfAKind
-        elif first_group == 3 and second_group == 2:
-            hand_type = HandType.FullHouse
-        elif first_group == 3:
-            hand_type = HandType.ThreeOfAKind
-        elif first_group == 2 and second_group == 2:
-            hand_type = HandType.TwoPair
-        elif first_group == 2:
-            hand_type = HandType.OnePair
-        else:
-            # A hand with jokers can never give a high card hand
-            assert(jokers == 0)
-            # A high card hand must have 5 unique, and so non-grouped, cards
-            assert(len(grouped_sorted) == 5)
-
-            hand_type = HandType.HighCard
-
-        return hand_type
+        # E.g. [13, 13, 6, 7, 7] => group sizes (2, 2, 1)
+        sizes = tuple(sorted((others.count(v) for v in set(others)), reverse=True))
+        return HAND_TYPES[(sizes, jokers)]
 
     def __init__(self, s, joker = False):
         cards, bid = s.split(" ")
@@ -72,22 +75,29 @@ class Hand:
         self.card_values = list(map(lambda k: card_map[k] if not self.joker else card_map_joker[k], cards))
         self.bid = int(bid)
         self.hand_type = Hand.calculate_hand_type(self.card_values, joker)
-    
+        self.key = hand_key(self.card_values, self.hand_type)
+
     def __lt__(self, other):
-        # Sort by hand type first...
-        if self.hand_type != other.hand_type:
-            return self.hand_type < other.hand_type
-        # ... and card values second
-        return self.card_values < other.card_values
+        return self.key < other.key
 
 def calculate_winnings(lines, joker = False):
-    hands = sorted([Hand(line, joker=joker) for line in lines])
-    winnings = 0
-    for rank, hand in enumerate(hands, start=1):
-        winnings += rank * hand.bid
-    return winnings
+    values = card_map_joker if joker else card_map
+    keys = []
+    bids = []
+    for line in lines:
+        cards, bid = line.split(" ")
+        card_values = [values[c] for c in cards]
+        keys.append(hand_key(card_values, Hand.calculate_hand_type(card_values, joker)))
+        bids.append(int(bid))
+
+    # Pack each bid into the low bits of its sort key, so that ranking is a plain sort of integers. The bids get
+    # as many bits as the largest one needs.
+    bid_bits = max(bids, default=0).bit_length()
+    packed = sorted(key << bid_bits | bid for key, bid in zip(keys, bids))
+    bid_mask = (1 << bid_bits) - 1
+    return sum(rank * (p & bid_mask) for rank, p in enumerate(packed, start=1))
 
 if __name__=='__main__':
     lines = open('data/day7.txt').read().splitlines()
     print(f"Part 1: {calculate_winnings(lines, joker=False)}")
-    print(f"Part 2: {calculate_winnings(lines, joker=True)}")
\ No newline at end of file
+    print(f"Part 2: {calculate_winnings(lines, joker=True)}")
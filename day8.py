@@ -1,6 +1,10 @@
 import re
+import array
+import operator
 import itertools
-from math import lcm
+from dataclasses import dataclass
+from math import gcd, lcm
+from common import find_cycle
 
 def parse_network(net):
     NODE_REGEX = re.compile(r'(\w+) = \((\w+), (\w+)\)')
@@ -12,33 +16,160 @@ def parse_network(net):
 
     return network
 
+def gather(table, indices):
+    """ (table[i] for i in indices) as a tuple, in a single C-level call """
+    if len(indices) < 2:
+        return tuple(table[i] for i in indices)
+    return operator.itemgetter(*indices)(table)
+
+@dataclass
+class GhostCycle:
+    """ The steps at which one ghost stands on an end node: the ones in tail, plus from cycle_start onwards,
+        every step t with t % modulus in residues """
+    tail: set[int]
+    cycle_start: int
+    modulus: int
+    residues: set[int]
+
+    def hits(self, step):
+        return step in self.tail if step < self.cycle_start else step % self.modulus in self.residues
+
+class CompiledNetwork:
+    """ The network with integer node IDs and successors in flat arrays, plus a table for one full pass over the
+        directions. Steps are counted in passes (len(directions) steps each), where the state is just the node. """
+    def __init__(self, directions, network, end_suffix = 'Z'):
+        self.names = list(network)
+        self.ids = {name: i for i, name in enumerate(self.names)}
+        self.left = array.array('i', (self.ids[left] for left, _ in network.values()))
+        self.right = array.array('i', (self.ids[right] for _, right in network.values()))
+        self.successors = [self.left if d == 'L' else self.right for d in directions]
+        self.period = len(directions)
+        self.is_end = bytes(name.endswith(end_suffix) for name in self.names)
+
+        # Walk all nodes through one pass at once. end_hits[node] lists the steps (1..period) within a pass
+        # starting at node that end on an end node.
+        nodes = list(range(len(self.names)))
+        self.end_hits = [[] for _ in nodes]
+        for step, successor in enumerate(self.successors, start=1):
+            nodes = list(map(successor.__getitem__, nodes))
+            hits = bytes(map(self.is_end.__getitem__, nodes))
+            i = hits.find(1)
+            while i != -1:
+                self.end_hits[i].append(step)
+                i = hits.find(1, i + 1)
+
+        # Binary lifting: jumps[k][node] is where node ends up after 2^k passes
+        self.jumps = [array.array('i', nodes)]
+
+    def jump_table(self, k):
+        while len(self.jumps) <= k:
+            previous = self.jumps[-1]
+            self.jumps.append(array.array('i', map(previous.__getitem__, previous)))
+        return self.jumps[k]
+
+    def position_after(self, node, steps):
+        """ The node reached after a number of steps, in O(log(steps) + len(directions)) """
+        passes, rest = divmod(steps, self.period)
+        k = 0
+        while passes:
+            if passes & 1:
+                node = self.jump_table(k)[node]
+            passes >>= 1
+            k += 1
+        for successor in self.successors[:rest]:
+            node = successor[node]
+        return node
+
+    def lockstep(self, nodes):
+        """ Advance many ghosts together: positions live in one tuple and each step is a single gather through the
+            successor array. Yields (step, mask) forever, where mask has a 1 byte for each ghost on an end node. """
+        # Gathering from lists is faster than from arrays, since the ints already exist
+        left, right = list(self.left), list(self.right)
+        successors = [left if successor is self.left else right for successor in self.successors]
+
+        positions = tuple(nodes)
+        for step, successor in enumerate(itertools.chain.from_iterable(itertools.repeat(successors)), start=1):
+            positions = gather(successor, positions)
+            yield (step, bytes(gather(self.is_end, positions)))
+
+    def first_end_steps(self, nodes):
+        """ The first step at which each ghost reaches an end node, by stepping all of them in lockstep """
+        first_steps = [0] * len(nodes)
+        remaining = len(nodes)
+        for step, mask in self.lockstep(nodes):
+            i = mask.find(1)
+            while i != -1:
+                if first_steps[i] == 0:
+                    first_steps[i] = step
+                    remaining -= 1
+                i = mask.find(1, i + 1)
+            if remaining == 0:
+                return first_steps
+
+    def ghost_cycle(self, node):
+        """ Find when a ghost starting at node stands on end nodes: a finite tail, then a repeating cycle """
+        full_pass = self.jump_table(0)
+        _, cycle_start, cycle_length = find_cycle(node, full_pass.__getitem__, lambda n: n)
+
+        tail = set()
+        residues = set()
+        modulus = cycle_length * self.period
+        for p in range(cycle_start + cycle_length):
+            for step in self.end_hits[node]:
+                if p < cycle_start:
+                    tail.add(p * self.period + step)
+                else:
+                    residues.add((p * self.period + step) % modulus)
+            node = full_pass[node]
+
+        return GhostCycle(tail, cycle_start * self.period + 1, modulus, residues)
+
+def crt(a, m, b, n):
+    """ The t (mod lcm(m, n)) with t = a (mod m) and t = b (mod n), or None if there is none """
+    g = gcd(m, n)
+    if (b - a) % g:
+        return None
+    k = (b - a) // g * pow(m // g, -1, n // g) % (n // g)
+    return (a + m * k) % lcm(m, n)
+
+def first_common_hit(ghosts):
+    """ The first step at which all ghosts stand on end nodes at once, or None if that never happens """
+    # Before the last cycle starts, a ghost may still be in its tail, so check those steps directly
+    candidates = [t for ghost in ghosts for t in ghost.tail if all(other.hits(t) for other in ghosts)]
+
+    # After that, merge the repeating hits of all ghosts with the Chinese remainder theorem
+    residues, modulus = {0}, 1
+    for ghost in ghosts:
+        residues = {r for a in residues for b in ghost.residues if (r := crt(a, modulus, b, ghost.modulus)) is not None}
+        modulus = lcm(modulus, ghost.modulus)
+    # With no ghosts at all, this gives 1, like lcm() of no step counts does
+    start = max((ghost.cycle_start for ghost in ghosts), default=1)
+    candidates += [start + (r - start) % modulus for r in residues]
+
+    return min(candidates, default=None)
+
 # Part 1
 def count_steps(directions, network):
-    current_node = 'AAA'
+    compiled = CompiledNetwork(directions, network)
+    current_node = compiled.ids['AAA']
+    end_node = compiled.ids['ZZZ']
 
-    for step, dir in enumerate(itertools.chain.from_iterable(itertools.repeat(directions)), start=1):
-        index = 0 if dir == 'L' else 1
-        current_node = network[current_node][index]
-        if current_node == 'ZZZ':
+    for step, successor in enumerate(itertools.chain.from_iterable(itertools.repeat(compiled.successors)), start=1):
+        current_node = successor[current_node]
+        if current_node == end_node:
             return step
 
 # Part 2
-def count_steps_simultaneous(directions, network):
-    current_nodes = [k for k in network.keys() if k.endswith("A")]
-    cycle_length = [0] * len(current_nodes)
-
-    for step, dir in enumerate(itertools.chain.from_iterable(itertools.repeat(directions)), start=1):
-        index = 0 if dir == 'L' else 1
-        for i, node in enumerate(current_nodes):
-            current_nodes[i] = network[node][index]
-
-            if current_nodes[i].endswith("Z"):
-                cycle_length[i] = step
+def count_steps_simultaneous(directions, network, lockstep = False):
+    """ With lockstep = True, step all ghosts together until each has reached an end node, and assume that every
+        ghost then repeats with exactly that period (true for the puzzle inputs). Otherwise, solve exactly. """
+    compiled = CompiledNetwork(directions, network)
+    starts = [compiled.ids[k] for k in network.keys() if k.endswith("A")]
 
-        if all([n > 0 for n in cycle_length]):
-            break
+    if lockstep:
+        return lcm(*compiled.first_end_steps(starts))
 
-    return lcm(*cycle_length)
+    return first_common_hit([compiled.ghost_cycle(node) for node in starts])
 
 if __name__=='__main__':
     lines = open('data/day8.txt').read().splitlines()
@@ -46,4 +177,4 @@ if __name__=='__main__':
     network = parse_network(lines[2:])
 
     print(f"Part 1: {count_steps(directions, network)}")
-    print(f"Part 2: {count_steps_simultaneous(directions, network)}")
\ No newline at end of file
+    print(f"Part 2: {count_steps_simultaneous(directions, network)}")
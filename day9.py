@@ -1,23 +1,44 @@
-import itertools
-from collections import deque
+import math
+import operator
+import functools
+from collections import defaultdict, deque
 
-def extrapolate_history(history):
-    # Generate a list of differences: [[1, 3, 6, 10, 15, 21], [2, 3, 4, 5, 6], [1, 1, 1, 1], [0, 0, 0]]
-    # diffs[0] contains the original values, followed by each set of differences in turn
-    diffs = [deque(history)]
-    while not all(x == 0 for x in diffs[-1]):
-        diffs.append(deque([b-a for (a, b) in itertools.pairwise(diffs[-1])]))
+@functools.cache
+def extrapolation_weights(length):
+    """ Binomial weights for a history of the given length: the next value is sum(next_weights[i] * history[i]),
+        and the previous value is sum(previous_weights[i] * history[i]). This is what the difference pyramid
+        adds up to, since the length:th differences of the history are all zero. """
+    next_weights = tuple((-1) ** (length - 1 - i) * math.comb(length, i) for i in range(length))
+    previous_weights = tuple((-1) ** i * math.comb(length, i + 1) for i in range(length))
+    return (next_weights, previous_weights)
+
+def dot(a, b):
+    return sum(map(operator.mul, a, b))
 
-    # Work backwards through the lists adding up values
-    for current, previous in itertools.pairwise(reversed(diffs)):
-        previous.append(current[-1] + previous[-1])
-        previous.appendleft(previous[0] - current[0])
+def extrapolate_history(history):
+    """ Return the history with the previous value prepended and the next value appended """
+    history = list(history)
+    next_weights, previous_weights = extrapolation_weights(len(history))
+    return deque([dot(previous_weights, history), *history, dot(next_weights, history)])
 
-    return diffs[0]
+def extrapolate_histories(histories):
+    """ Batch version of extrapolate_history. Returns (next values, previous values), in the same order. """
+    histories = [list(history) for history in histories]
+    next_values = [dot(extrapolation_weights(len(h))[0], h) for h in histories]
+    previous_values = [dot(extrapolation_weights(len(h))[1], h) for h in histories]
+    return (next_values, previous_values)
 
 def solve(histories):
-    histories = [extrapolate_history(history) for history in histories]
-    return [sum(h[-1] for h in histories), sum(h[0] for h in histories)]
+    # Extrapolation is linear, so the sum over all histories of one length only needs the column sums of those histories
+    column_sums = defaultdict(list)
+    for history in histories:
+        history = list(history)
+        sums = column_sums[len(history)]
+        column_sums[len(history)] = list(map(operator.add, sums, history)) if sums else history
+
+    part1 = sum(dot(extrapolation_weights(length)[0], sums) for length, sums in column_sums.items())
+    part2 = sum(dot(extrapolation_weights(length)[1], sums) for length, sums in column_sums.items())
+    return [part1, part2]
 
 if __name__=='__main__':
     lines = open('data/day9.txt').read().splitlines()